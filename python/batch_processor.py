@@ -11,21 +11,42 @@ try:
     from .scraper import Scraper
     from .vector_store import VectorStore
     from .extractor import Extractor
+    from .dedup import PolicyDocumentIndex
+    from .metrics import StageTimer, timed, record, COMPANIES_PROCESSED
+    from .processing_log import write_log_rows, maintain_partitions
+    from .claims import claim_pending
 except ImportError:
     from models import ProcessingRequest
     from discovery import Discovery
     from scraper import Scraper
     from vector_store import VectorStore
     from extractor import Extractor
+    from dedup import PolicyDocumentIndex
+    from metrics import StageTimer, timed, record, COMPANIES_PROCESSED
+    from processing_log import write_log_rows, maintain_partitions
+    from claims import claim_pending
+
+DEFAULT_RECRAWL_INTERVAL = int(os.getenv("RECRAWL_DEFAULT_INTERVAL_SECONDS", 7 * 24 * 3600))
+
+# A company's privacy/terms page can move. Keep the stored URL current so the content
+# hash written after fetching matches it; the hash and validators of an old URL are dropped.
+POLICY_PAGE_UPSERT = """
+    INSERT INTO policy_pages (company_id, page_type, url) VALUES (%s, %s, %s)
+    ON CONFLICT (company_id, page_type) DO UPDATE SET
+    url = EXCLUDED.url,
+    content_hash = CASE WHEN policy_pages.url = EXCLUDED.url THEN policy_pages.content_hash END,
+    etag = CASE WHEN policy_pages.url = EXCLUDED.url THEN policy_pages.etag END,
+    last_modified = CASE WHEN policy_pages.url = EXCLUDED.url THEN policy_pages.last_modified END
+"""
 
 class BatchProcessor:
-    def __init__(self):
-        # Initialize components once
+    def __init__(self, vector_store=None, extractor=None):
+        # Initialize components once (callers such as benchmark.py may inject stand-ins)
         try:
             self.discovery = Discovery()
             self.scraper = Scraper()
-            self.vector_store = VectorStore()
-            self.extractor = Extractor()
+            self.vector_store = vector_store or VectorStore()
+            self.extractor = extractor or Extractor()
         except Exception as e:
             print(f"Error initializing components in BatchProcessor: {e}")
             raise e
@@ -33,6 +54,27 @@ class BatchProcessor:
     def get_db_connection(self):
         return psycopg2.connect(os.getenv("DATABASE_URL"))
 
+    def _iter_chunks(self, text: str):
+        # Chunks are produced lazily; only the chunking work itself is charged to the "chunk" stage
+        chunks = self.scraper.iter_chunks(text)
+        elapsed = 0.0
+        try:
+            while True:
+                start = time.perf_counter()
+                chunk = next(chunks, None)
+                elapsed += time.perf_counter() - start
+                if chunk is None:
+                    return
+                yield chunk
+        finally:
+            record("chunk", elapsed)
+
+    def _chunk_and_embed(self, text: str, metadata: dict) -> list[str]:
+        # Replace the page's points from earlier runs rather than adding a second copy
+        self.vector_store.delete({"url": metadata["url"]})
+        # Chunks stream straight into batched embedding; the list is kept for extraction
+        return self.vector_store.add_chunks(self._iter_chunks(text), metadata)
+
     def import_csv_to_db(self, csv_path: str):
         """
         Step 1: Read CSV and insert into DB with status 'pending'
@@ -98,19 +140,30 @@ class BatchProcessor:
             cursor.close()
             conn.close()
 
-    def process_pending_companies(self, limit: int = 5):
+    def process_pending_companies(self, limit: int = 5, on_result=None, collect_details: bool = True, doc_index=None):
         """
         Step 2: Read 'pending' companies from DB and process them
+
+        on_result: optional callback(item_result) invoked after each company is committed
+                   (used by the job runner to persist per-company results)
+        collect_details: set False to keep per-company results out of the returned summary
+        doc_index: PolicyDocumentIndex to share across calls (a job's batches dedup against each other)
         """
         start_time = time.time()
+        # Fresh dedup index per run unless the caller shares one, so policy changes between runs are picked up
+        if doc_index is None:
+            doc_index = PolicyDocumentIndex()
         conn = self.get_db_connection()
+        # Keep processing_log partitions ahead of time (no-op most calls)
+        maintain_partitions(conn)
         # Use RealDictCursor to get column names
         cursor = conn.cursor(cursor_factory=RealDictCursor)
 
         try:
-            # Fetch pending records with locking to prevent race conditions if multiple workers ran
-            cursor.execute("SELECT id, name, domain FROM companies WHERE status = 'pending' LIMIT %s FOR UPDATE SKIP LOCKED", (limit,))
-            rows = cursor.fetchall()
+            # Claim rows by moving them to 'processing' and committing. A FOR UPDATE lock alone
+            # would be released by the first per-company commit below, letting other workers
+            # pick up the rest of this batch. Oldest first (the idx_companies_pending order).
+            rows = claim_pending(conn, cursor, limit)
             
             if not rows:
                 return {
@@ -125,57 +178,16 @@ class BatchProcessor:
             failed_count = 0
 
             for row in rows:
-                company_id = row['id']
-                domain = row['domain']
-                name = row['name']
-                
-                item_result = {
-                    "id": company_id,
-                    "domain": domain,
-                    "status": "processing",
-                    "error": None
-                }
-                
-                # Switch processing status immediately or just process?
-                # Since we have the lock, we can process.
-                
-                try:
-                    # Pass the EXISTING connection/cursor to avoid deadlock and ensuring atomicity
-                    # Actually _process_single_domain uses normal cursor, we have RealDictCursor.
-                    # Mix is fine, or we create a standard cursor from the same connection.
-                    std_cursor = conn.cursor()
-                    
-                    self._process_single_domain(company_id, name, domain, item_result, conn, std_cursor)
-                    
-                    # Update status to completed
-                    std_cursor.execute("UPDATE companies SET status = 'completed', processed_at = NOW() WHERE id = %s", (company_id,))
-                    std_cursor.close() # Close inner cursor
-                    
-                    # Commit transaction for this item (or batch? batch is better for performance but item is safer for partial progress)
-                    # Let's commit per item so we release locks and progress is saved even if next item crashes
-                    conn.commit()
-                    
-                    item_result['status'] = 'completed'
+                item_result = self.process_company(conn, row['id'], row['name'], row['domain'], doc_index)
+                if item_result['status'] == 'completed':
                     successful_count += 1
-                    
-                except Exception as e:
-                    conn.rollback() # Rollback ANY partial changes for this item
-                    print(f"Error processing {domain}: {e}")
-                    
-                    # New transaction to record failure
-                    try:
-                         fail_cursor = conn.cursor()
-                         fail_cursor.execute("UPDATE companies SET status = 'failed', error_message = %s WHERE id = %s", (str(e), company_id))
-                         conn.commit()
-                         fail_cursor.close()
-                    except:
-                        pass
-
-                    item_result['status'] = 'failed'
-                    item_result['error'] = str(e)
+                else:
                     failed_count += 1
-                
-                results.append(item_result)
+
+                if on_result is not None:
+                    on_result(item_result)
+                if collect_details:
+                    results.append(item_result)
 
             return {
                 "status": "completed",
@@ -184,6 +196,7 @@ class BatchProcessor:
                 "successful": successful_count,
                 "failed": failed_count,
                 "processing_time_seconds": round(time.time() - start_time, 2),
+                "dedup_stats": dict(doc_index.stats),
                 "details": results
             }
 
@@ -191,7 +204,52 @@ class BatchProcessor:
             cursor.close()
             conn.close()
 
-    def _process_single_domain(self, company_id, name, domain, result_tracker, conn=None, cursor=None):
+    def process_company(self, conn, company_id, name, domain, doc_index=None) -> dict:
+        """
+        Run the pipeline for one company the caller has claimed, then mark it completed or
+        failed and commit. Returns the per-company result (id, domain, status, error, ...).
+        """
+        item_result = {
+            "id": company_id,
+            "domain": domain,
+            "status": "processing",
+            "error": None
+        }
+
+        try:
+            cursor = conn.cursor()
+            self._process_single_domain(company_id, name, domain, item_result, conn, cursor, doc_index)
+            cursor.execute("UPDATE companies SET status = 'completed', processed_at = NOW() WHERE id = %s", (company_id,))
+            cursor.close()
+            # Commit per company so progress is saved even if the next one crashes
+            conn.commit()
+
+            item_result['status'] = 'completed'
+            COMPANIES_PROCESSED.inc('completed')
+
+        except Exception as e:
+            conn.rollback() # Rollback ANY partial changes for this item
+            print(f"Error processing {domain}: {e}")
+
+            # New transaction to record failure
+            try:
+                 fail_cursor = conn.cursor()
+                 fail_cursor.execute("UPDATE companies SET status = 'failed', error_message = %s WHERE id = %s", (str(e), company_id))
+                 write_log_rows(fail_cursor, [(company_id, 'batch_complete', 'failed', str(e), None)])
+                 conn.commit()
+                 fail_cursor.close()
+            except:
+                pass
+
+            item_result['status'] = 'failed'
+            item_result['error'] = str(e)
+            COMPANIES_PROCESSED.inc('failed')
+
+        return item_result
+
+    def _process_single_domain(self, company_id, name, domain, result_tracker, conn=None, cursor=None, doc_index=None):
+        if doc_index is None:
+            doc_index = PolicyDocumentIndex()
         should_close_conn = False
         if conn is None:
             conn = self.get_db_connection()
@@ -202,92 +260,149 @@ class BatchProcessor:
             should_close_cursor = True
         else:
             should_close_cursor = False
+
+        # Per-stage durations for this company; also collects embed/upsert timings
+        # recorded inside VectorStore on this thread.
+        timer = StageTimer()
         
         try:
-             # If called independently (not from batch loop), ensure company exists
-            if should_close_conn:
-                cursor.execute("INSERT INTO companies (id, name, domain) VALUES (%s, %s, %s) ON CONFLICT (id) DO NOTHING",
-                            (company_id, name, domain))
-                conn.commit()
-
-            # 1. Discovery
-            links = self.discovery.find_policy_links(domain)
-            result_tracker['privacy_url'] = links.get('privacy')
-            result_tracker['terms_url'] = links.get('terms')
-            
-            # Save links
-            for p_type, url in links.items():
-                if url:
-                    cursor.execute("INSERT INTO policy_pages (company_id, page_type, url) VALUES (%s, %s, %s) ON CONFLICT DO NOTHING",
-                                (company_id, p_type, url))
+            with timer.bind():
+                 # If called independently (not from batch loop), ensure company exists
+                if should_close_conn:
+                    cursor.execute("INSERT INTO companies (id, name, domain) VALUES (%s, %s, %s) ON CONFLICT (id) DO NOTHING",
+                                (company_id, name, domain))
+                    conn.commit()
+
+                # 1. Discovery
+                with timed("discovery"):
+                    links = self.discovery.find_policy_links(domain)
+                result_tracker['privacy_url'] = links.get('privacy')
+                result_tracker['terms_url'] = links.get('terms')
             
-            # If we own connection, commit intermediate steps? No, keep it atomic preferably.
-            # But scraper is slow, so maybe not hold DB lock for scraping if possible?
-            # Creating vectors doesn't need DB lock.
-            # But inserting into policy_pages does.
+                # Save links
+                with timed("db_write"):
+                    for p_type, url in links.items():
+                        if url:
+                            cursor.execute(POLICY_PAGE_UPSERT, (company_id, p_type, url))
             
-            # 2. Scrape & Vectorize (Long running, non-DB)
-            all_text_chunks = []
-            for p_type, url in links.items():
-                if url:
-                    text = self.scraper.fetch_page(url)
-                    if text:
-                        clean_text = self.scraper.clean_text(text)
-                        chunks = self.scraper.chunk_text(clean_text)
-                        all_text_chunks.extend(chunks)
-                        
-                        metadatas = [{"domain": domain, "type": p_type, "url": url, "text": chunk} for chunk in chunks]
-                        self.vector_store.add_texts(chunks, metadatas)
+                # If we own connection, commit intermediate steps? No, keep it atomic preferably.
+                # But scraper is slow, so maybe not hold DB lock for scraping if possible?
+                # Creating vectors doesn't need DB lock.
+                # But inserting into policy_pages does.
             
-            # 3. Extract Scopes
-            scopes_found_count = 0
-            if all_text_chunks:
-                scopes = self.extractor.extract_scopes(all_text_chunks)
-                scopes_found_count = sum(1 for k, v in scopes.items() if v is True)
+                # 2. Scrape & Vectorize (Long running, non-DB)
+                # Documents already seen in this run (same URL or same content) are reused,
+                # not fetched/embedded again; new ones are embedded while they are chunked.
+                all_text_chunks = []
+                doc_hashes = []
+                for p_type, url in links.items():
+                    if url:
+                        cached = doc_index.lookup_url(url)
+                        if cached is not None:
+                            doc_hash, chunks = cached
+                        else:
+                            with timed("fetch"):
+                                fetched = self.scraper.fetch_document(url)
+                            text = fetched["text"]
+                            with timed("parse"):
+                                clean_text = self.scraper.clean_text(text) if text else ""
+                            static_text = clean_text
+                            if self.scraper.needs_rendering(clean_text, fetched):
+                                # JS-only page: retry through the headless browser pool
+                                with timed("render"):
+                                    rendered = self.scraper.render_page(url)
+                                if rendered:
+                                    with timed("parse"):
+                                        rendered_text = self.scraper.clean_text(rendered)
+                                    if len(rendered_text) > len(clean_text):
+                                        clean_text = rendered_text
+                            metadata = {"domain": domain, "type": p_type, "url": url}
+                            doc_hash, chunks, _ = doc_index.add_document(
+                                url, clean_text, lambda t, m=metadata: self._chunk_and_embed(t, m),
+                                static_text=static_text)
+
+                        if chunks:
+                            all_text_chunks.extend(chunks)
+                            doc_hashes.append(doc_hash)
+
+                        if doc_hash:
+                            # Baseline for the recrawler's change detection (see recrawl.py). The
+                            # recrawler only does plain fetches, so this is the hash of the static
+                            # text even when the page was rendered. Pages with history keep the
+                            # interval the recrawler estimated; the default is for new pages.
+                            with timed("db_write"):
+                                cursor.execute("""
+                                    UPDATE policy_pages SET content_hash = %s, last_checked_at = NOW(),
+                                    next_check_at = NOW() + make_interval(secs => COALESCE(check_interval_seconds, %s))
+                                    WHERE company_id = %s AND page_type = %s
+                                """, (doc_index.baseline_hash(url), DEFAULT_RECRAWL_INTERVAL, company_id, p_type))
+
+                # 3 & 4. Extraction runs once per distinct set of documents; results fan out
+                # to every company that references the same policies.
+                scopes, enrichment = None, None
+                if all_text_chunks:
+                    cached_extraction = doc_index.get_extraction(doc_hashes)
+                    if cached_extraction is not None:
+                        scopes, enrichment = cached_extraction
+                        result_tracker['deduplicated'] = True
+                    else:
+                        with timed("llm_scopes"):
+                            scopes = self.extractor.extract_scopes(all_text_chunks)
+                        with timed("llm_enrich"):
+                            enrichment = self.extractor.enrich_company_data(all_text_chunks, None)
+                        doc_index.set_extraction(doc_hashes, scopes, enrichment)
+
+                # 3. Extract Scopes
+                scopes_found_count = 0
+                if scopes is not None:
+                    scopes_found_count = sum(1 for k, v in scopes.items() if v is True)
                 
-                cursor.execute("""
-                    INSERT INTO policy_scopes (company_id, scope_registration, scope_legal, scope_customization, scope_marketing, scope_security)
-                    VALUES (%s, %s, %s, %s, %s, %s)
-                    ON CONFLICT (company_id) DO UPDATE SET
-                    scope_registration = EXCLUDED.scope_registration,
-                    scope_legal = EXCLUDED.scope_legal,
-                    scope_customization = EXCLUDED.scope_customization,
-                    scope_marketing = EXCLUDED.scope_marketing,
-                    scope_security = EXCLUDED.scope_security
-                """, (company_id, scopes.get('scope_registration'), scopes.get('scope_legal'), 
-                    scopes.get('scope_customization'), scopes.get('scope_marketing'), scopes.get('scope_security')))
+                    with timed("db_write"):
+                        cursor.execute("""
+                            INSERT INTO policy_scopes (company_id, scope_registration, scope_legal, scope_customization, scope_marketing, scope_security)
+                            VALUES (%s, %s, %s, %s, %s, %s)
+                            ON CONFLICT (company_id) DO UPDATE SET
+                            scope_registration = EXCLUDED.scope_registration,
+                            scope_legal = EXCLUDED.scope_legal,
+                            scope_customization = EXCLUDED.scope_customization,
+                            scope_marketing = EXCLUDED.scope_marketing,
+                            scope_security = EXCLUDED.scope_security,
+                            last_updated = NOW()
+                        """, (company_id, scopes.get('scope_registration'), scopes.get('scope_legal'),
+                            scopes.get('scope_customization'), scopes.get('scope_marketing'), scopes.get('scope_security')))
             
-            result_tracker['scopes_found'] = scopes_found_count
+                result_tracker['scopes_found'] = scopes_found_count
 
-            # 4. Enrich
-            emails_found_count = 0
-            if all_text_chunks:
-                enrichment = self.extractor.enrich_company_data(all_text_chunks, None)
+                # 4. Enrich
+                emails_found_count = 0
                 if enrichment:
                     if enrichment.get('generic_email'): emails_found_count += 1
                     if enrichment.get('contact_email'): emails_found_count += 1
                     if enrichment.get('privacy_email'): emails_found_count += 1
 
-                    cursor.execute("""
-                        UPDATE companies SET
-                        generic_email = COALESCE(%s, generic_email),
-                        contact_email = COALESCE(%s, contact_email),
-                        privacy_email = COALESCE(%s, privacy_email),
-                        delete_link = COALESCE(%s, delete_link),
-                        country = COALESCE(%s, country)
-                        WHERE id = %s
-                    """, (enrichment.get('generic_email'), enrichment.get('contact_email'), 
-                        enrichment.get('privacy_email'), enrichment.get('delete_link'), 
-                        enrichment.get('country'), company_id))
-            
-            result_tracker['emails_found'] = emails_found_count
-            
-            # Log completion
-            cursor.execute("INSERT INTO processing_log (company_id, step, status, message) VALUES (%s, 'batch_complete', 'completed', 'Finished batch processing step')",
-                           (company_id,))
-            
-            if should_close_conn:
-                conn.commit()
+                    with timed("db_write"):
+                        cursor.execute("""
+                            UPDATE companies SET
+                            generic_email = COALESCE(%s, generic_email),
+                            contact_email = COALESCE(%s, contact_email),
+                            privacy_email = COALESCE(%s, privacy_email),
+                            delete_link = COALESCE(%s, delete_link),
+                            country = COALESCE(%s, country)
+                            WHERE id = %s
+                        """, (enrichment.get('generic_email'), enrichment.get('contact_email'),
+                            enrichment.get('privacy_email'), enrichment.get('delete_link'),
+                            enrichment.get('country'), company_id))
+
+                result_tracker['emails_found'] = emails_found_count
+                result_tracker['stage_durations'] = {k: round(v, 3) for k, v in timer.durations.items()}
+
+                # Log completion, one row per stage so processing_log.duration_seconds shows where time goes
+                log_rows = [(company_id, stage, 'completed', None, seconds) for stage, seconds in timer.durations.items()]
+                log_rows.append((company_id, 'batch_complete', 'completed', 'Finished batch processing step', timer.total()))
+                write_log_rows(cursor, log_rows)
+
+                if should_close_conn:
+                    conn.commit()
 
         finally:
             if should_close_cursor:
@@ -0,0 +1,377 @@
+"""
+Offline end-to-end throughput benchmark for the BatchProcessor pipeline.
+
+Everything external is replaced by a local stand-in:
+- a local HTTP server serving synthetic company sites and policy pages
+  (configurable page size and latency)
+- a deterministic fake LLM with configurable latency
+- Qdrant in in-memory mode (QDRANT_URL=":memory:"), or the embedded local index
+  with --vector-backend local
+- a throwaway Postgres: a temporary cluster via initdb/pg_ctl, or a temporary
+  database on an existing server when --database-url is given
+
+Reports companies/second, per-stage latency percentiles and peak RSS.
+
+Usage:
+    python benchmark.py --companies 50 --page-kb 40 --http-latency-ms 20 --llm-latency-ms 200
+"""
+import argparse
+import csv
+import hashlib
+import json
+import os
+import random
+import re
+import resource
+import shutil
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlsplit, urlunsplit
+
+current_dir = os.path.dirname(os.path.abspath(__file__))
+if current_dir not in sys.path:
+    sys.path.append(current_dir)
+
+SCHEMA_FILE = os.path.join(current_dir, "..", "sql", "init.sql")
+
+WORDS = ("data personal information service users account provide process share third parties "
+         "cookies settings request access delete retain period law applicable rights").split()
+SCOPE_SENTENCES = {
+    "scope_registration": "When you register for an account we collect your name and email address.",
+    "scope_legal": "We retain records where required to comply with legal obligations.",
+    "scope_customization": "We use your preferences to personalize and customize your experience.",
+    "scope_marketing": "With your consent we send marketing communications and promotional offers.",
+    "scope_security": "Information is used for security purposes such as fraud prevention.",
+}
+SCOPE_KEYWORDS = {
+    "scope_registration": "register",
+    "scope_legal": "legal obligations",
+    "scope_customization": "personalize",
+    "scope_marketing": "marketing",
+    "scope_security": "security purposes",
+}
+EMAIL_RE = re.compile(r"[\w.+-]+@[\w-]+\.[\w.]+")
+
+
+# --- Synthetic sites -------------------------------------------------------
+
+def make_policy_page(seed: str, size_kb: int) -> bytes:
+    rng = random.Random(seed)
+    paragraphs = []
+    size = 0
+    scope_lines = [s for s in SCOPE_SENTENCES.values() if rng.random() < 0.6]
+    scope_lines.append(f"Contact our privacy team at privacy@{seed}.example.")
+    while size < size_kb * 1024:
+        sentence = " ".join(rng.choice(WORDS) for _ in range(rng.randint(8, 20))).capitalize() + "."
+        if scope_lines and rng.random() < 0.05:
+            sentence = scope_lines.pop()
+        paragraphs.append(f"<p>{sentence}</p>")
+        size += len(sentence) + 7
+    paragraphs.extend(f"<p>{s}</p>" for s in scope_lines)
+    body = "\n".join(paragraphs)
+    return f"<html><head><title>Policy</title></head><body><h1>Privacy Policy</h1>{body}</body></html>".encode()
+
+def make_home_page(site: str) -> bytes:
+    return (f"<html><body><h1>Company {site}</h1>"
+            f"<a href='/site/{site}/privacy'>Privacy Policy</a>"
+            f"<a href='/site/{site}/terms'>Terms of Service</a></body></html>").encode()
+
+
+class SiteHandler(BaseHTTPRequestHandler):
+    page_kb = 40
+    latency = 0.0
+    shared_every = 0  # every Nth site links to a shared policy page (exercises dedup)
+    _cache = {}
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_GET(self):
+        if self.latency:
+            time.sleep(self.latency)
+        parts = [p for p in self.path.split("/") if p]
+        if len(parts) < 2 or parts[0] != "site":
+            self.send_error(404)
+            return
+        site = parts[1]
+        page = parts[2] if len(parts) > 2 else ""
+        if page in ("privacy", "terms"):
+            seed = site
+            if self.shared_every and int(site) % self.shared_every == 0:
+                seed = "shared"
+            key = (seed, page)
+            if key not in self._cache:
+                self._cache[key] = make_policy_page(f"{seed}-{page}", self.page_kb)
+            body = self._cache[key]
+        elif page == "":
+            body = make_home_page(site)
+        else:
+            self.send_error(404)
+            return
+        self.send_response(200)
+        self.send_header("Content-Type", "text/html; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+def start_site_server(page_kb: int, latency_ms: int, shared_every: int):
+    handler = type("BenchSiteHandler", (SiteHandler,), {
+        "page_kb": page_kb, "latency": latency_ms / 1000.0, "shared_every": shared_every, "_cache": {}})
+    server = ThreadingHTTPServer(("127.0.0.1", 0), handler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    return server
+
+
+# --- Fake LLM / embeddings -------------------------------------------------
+
+def make_fake_llm(latency_ms: int):
+    """Deterministic chat model stand-in: answers from keywords found in the prompt."""
+    from langchain_core.messages import AIMessage
+    from langchain_core.runnables import RunnableLambda
+
+    def respond(prompt_value):
+        text = prompt_value.to_string() if hasattr(prompt_value, "to_string") else str(prompt_value)
+        time.sleep(latency_ms / 1000.0)
+        policy = text.split("Policy Text:", 1)[-1]
+        if "scope_registration" in text:
+            answer = {k: kw in policy for k, kw in SCOPE_KEYWORDS.items()}
+        else:
+            emails = EMAIL_RE.findall(policy)
+            answer = {
+                "generic_email": None,
+                "contact_email": None,
+                "privacy_email": emails[0] if emails else None,
+                "delete_link": None,
+                "country": None,
+            }
+        return AIMessage(content=json.dumps(answer))
+
+    return RunnableLambda(respond)
+
+
+class FakeEmbeddings:
+    """Hash-based 384-d embeddings so runs don't need the sentence-transformers model."""
+
+    dim = 384
+
+    def _embed(self, text: str) -> list[float]:
+        digest = hashlib.sha256(text.encode("utf-8")).digest()
+        rng = random.Random(digest)
+        return [rng.uniform(-1, 1) for _ in range(self.dim)]
+
+    def embed_documents(self, texts):
+        return [self._embed(t) for t in texts]
+
+    def embed_query(self, text):
+        return self._embed(text)
+
+
+# --- Throwaway Postgres ----------------------------------------------------
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+def _pg_bin(name: str):
+    path = shutil.which(name)
+    if path:
+        return path
+    pg_config = shutil.which("pg_config")
+    if pg_config:
+        bindir = subprocess.check_output([pg_config, "--bindir"], text=True).strip()
+        candidate = os.path.join(bindir, name)
+        if os.path.exists(candidate):
+            return candidate
+    return None
+
+def _load_schema(conn):
+    with open(SCHEMA_FILE) as f:
+        # CREATE DATABASE can't run inside a transaction and isn't needed here
+        schema = "".join(line for line in f if not line.strip().upper().startswith("CREATE DATABASE"))
+    with conn.cursor() as cur:
+        cur.execute(schema)
+    conn.commit()
+
+
+class ThrowawayPostgres:
+    def __init__(self, admin_url: str = None):
+        self.admin_url = admin_url
+        self.data_dir = None
+        self.db_name = None
+        self.url = None
+
+    def __enter__(self):
+        import psycopg2
+        if self.admin_url:
+            # Temporary database on an existing server
+            self.db_name = f"bench_{uuid.uuid4().hex[:8]}"
+            admin = psycopg2.connect(self.admin_url)
+            admin.autocommit = True
+            with admin.cursor() as cur:
+                cur.execute(f"CREATE DATABASE {self.db_name}")
+            admin.close()
+            self.url = urlunsplit(urlsplit(self.admin_url)._replace(path=f"/{self.db_name}"))
+        else:
+            initdb, pg_ctl = _pg_bin("initdb"), _pg_bin("pg_ctl")
+            if not initdb or not pg_ctl:
+                raise RuntimeError("initdb/pg_ctl not found; pass --database-url to use an existing server")
+            self.data_dir = tempfile.mkdtemp(prefix="bench_pg_")
+            port = _free_port()
+            subprocess.run([initdb, "-D", self.data_dir, "-U", "bench", "--auth=trust"],
+                           check=True, stdout=subprocess.DEVNULL)
+            subprocess.run([pg_ctl, "-D", self.data_dir, "-w", "-l", os.path.join(self.data_dir, "log"),
+                            "-o", f"-p {port} -k {self.data_dir} -c listen_addresses=127.0.0.1 -c fsync=off",
+                            "start"], check=True, stdout=subprocess.DEVNULL)
+            self.url = f"postgresql://bench@127.0.0.1:{port}/postgres"
+
+        conn = psycopg2.connect(self.url)
+        _load_schema(conn)
+        conn.close()
+        return self
+
+    def __exit__(self, *exc):
+        import psycopg2
+        if self.data_dir:
+            subprocess.run([_pg_bin("pg_ctl"), "-D", self.data_dir, "-m", "immediate", "stop"],
+                           stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+            shutil.rmtree(self.data_dir, ignore_errors=True)
+        elif self.db_name:
+            admin = psycopg2.connect(self.admin_url)
+            admin.autocommit = True
+            with admin.cursor() as cur:
+                cur.execute(f"DROP DATABASE IF EXISTS {self.db_name}")
+            admin.close()
+
+
+# --- Reporting -------------------------------------------------------------
+
+def percentile(values: list, pct: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    k = (len(ordered) - 1) * pct / 100.0
+    lo, hi = int(k), min(int(k) + 1, len(ordered) - 1)
+    return ordered[lo] + (ordered[hi] - ordered[lo]) * (k - lo)
+
+def peak_rss_mb() -> float:
+    # ru_maxrss is KiB on Linux, bytes on macOS
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return rss / (1024 * 1024) if sys.platform == "darwin" else rss / 1024
+
+
+def run(args) -> dict:
+    server = start_site_server(args.page_kb, args.http_latency_ms, args.shared_every)
+    host, port = server.server_address
+    print(f"Synthetic sites on http://{host}:{port}/site/<n>/")
+
+    os.environ["QDRANT_URL"] = ":memory:"
+    # "local" = embedded in-process index instead of in-memory Qdrant
+    os.environ["VECTOR_BACKEND"] = args.vector_backend
+    os.environ.pop("VECTOR_STORE_PATH", None)
+    # All synthetic sites share one host; don't let per-host politeness serialize them
+    os.environ.setdefault("HOST_MIN_DELAY", "0")
+    os.environ.setdefault("HOST_CONCURRENCY", "64")
+    os.environ.pop("QDRANT_PATH", None)
+    # Never reach out to a hosted model from a benchmark
+    os.environ.pop("HUGGINGFACEHUB_API_TOKEN", None)
+
+    from batch_processor import BatchProcessor
+    from vector_store import VectorStore
+    from extractor import Extractor
+    from dedup import PolicyDocumentIndex
+
+    with ThrowawayPostgres(args.database_url) as pg:
+        os.environ["DATABASE_URL"] = pg.url
+
+        csv_path = os.path.join(tempfile.mkdtemp(prefix="bench_csv_"), "companies.csv")
+        with open(csv_path, "w", newline="") as f:
+            writer = csv.writer(f)
+            writer.writerow(["id", "name", "generic_email", "contact_email", "privacy_email", "delete_link", "domain", "country"])
+            for i in range(args.companies):
+                writer.writerow([f"bench-{i}", f"Company {i}", "", "", "", "", f"{host}:{port}/site/{i}", ""])
+
+        extractor = Extractor()
+        extractor.llm = make_fake_llm(args.llm_latency_ms)
+        vector_store = VectorStore(embeddings=FakeEmbeddings() if args.fake_embeddings else None)
+        processor = BatchProcessor(vector_store=vector_store, extractor=extractor)
+
+        import_result = processor.import_csv_to_db(csv_path)
+        if import_result["status"] != "completed":
+            raise RuntimeError(import_result["message"])
+
+        stage_samples = {}
+        processed = successful = failed = 0
+        # Shared across batches, like a background job (jobs.py)
+        doc_index = PolicyDocumentIndex()
+        start = time.perf_counter()
+        while True:
+            result = processor.process_pending_companies(limit=args.batch_size, doc_index=doc_index)
+            if not result.get("total_processed"):
+                break
+            processed += result["total_processed"]
+            successful += result.get("successful", 0)
+            failed += result.get("failed", 0)
+            for item in result.get("details", []):
+                for stage, seconds in item.get("stage_durations", {}).items():
+                    stage_samples.setdefault(stage, []).append(seconds)
+        elapsed = time.perf_counter() - start
+
+    server.shutdown()
+
+    return {
+        "companies": processed,
+        "successful": successful,
+        "failed": failed,
+        "elapsed_seconds": round(elapsed, 3),
+        "companies_per_second": round(processed / elapsed, 3) if elapsed else 0.0,
+        "stage_latency_seconds": {
+            stage: {
+                "p50": round(percentile(samples, 50), 4),
+                "p90": round(percentile(samples, 90), 4),
+                "p99": round(percentile(samples, 99), 4),
+                "count": len(samples),
+            }
+            for stage, samples in sorted(stage_samples.items())
+        },
+        "peak_rss_mb": round(peak_rss_mb(), 1),
+        "config": vars(args),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Offline BatchProcessor throughput benchmark")
+    parser.add_argument("--companies", type=int, default=20)
+    parser.add_argument("--batch-size", type=int, default=5, help="limit passed to process_pending_companies")
+    parser.add_argument("--page-kb", type=int, default=40, help="size of each synthetic policy page")
+    parser.add_argument("--http-latency-ms", type=int, default=20)
+    parser.add_argument("--llm-latency-ms", type=int, default=200)
+    parser.add_argument("--shared-every", type=int, default=0,
+                        help="every Nth company links to a shared policy page (0 = none)")
+    parser.add_argument("--fake-embeddings", action="store_true",
+                        help="hash-based embeddings instead of loading all-MiniLM-L6-v2")
+    parser.add_argument("--vector-backend", choices=("qdrant", "local"), default="qdrant",
+                        help="in-memory Qdrant or the embedded local index")
+    parser.add_argument("--database-url", default=os.getenv("BENCH_DATABASE_URL"),
+                        help="existing server to create a temporary database on (default: temporary initdb cluster)")
+    parser.add_argument("--output", help="write the JSON report to this file")
+    args = parser.parse_args()
+
+    report = run(args)
+    text = json.dumps(report, indent=2)
+    print(text)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(text)
+
+
+if __name__ == "__main__":
+    main()
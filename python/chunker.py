@@ -0,0 +1,139 @@
+import os
+import re
+
+# Must match the model used by VectorStore. all-MiniLM-L6-v2 truncates at 256
+# word-pieces, including the [CLS] and [SEP] tokens it adds itself.
+EMBEDDING_MODEL_NAME = "sentence-transformers/all-MiniLM-L6-v2"
+EMBEDDING_MAX_TOKENS = 256
+SPECIAL_TOKENS = 2
+
+# Sentence ends: terminal punctuation followed by whitespace and an upper-case/digit/quote start
+SENTENCE_SPLIT_RE = re.compile(r'(?<=[.!?;])\s+(?=[A-Z0-9"\'(\[])')
+# Rough word-piece approximation used when the real tokenizer is unavailable
+APPROX_TOKEN_RE = re.compile(r"\w+|[^\w\s]")
+
+_tokenizer = None
+_tokenizer_loaded = False
+
+def get_tokenizer():
+    """Lazily load the embedding model's tokenizer once per process (None if unavailable)."""
+    global _tokenizer, _tokenizer_loaded
+    if not _tokenizer_loaded:
+        _tokenizer_loaded = True
+        try:
+            from transformers import AutoTokenizer
+            _tokenizer = AutoTokenizer.from_pretrained(EMBEDDING_MODEL_NAME)
+        except Exception as e:
+            print(f"WARNING: Could not load tokenizer for {EMBEDDING_MODEL_NAME}: {e}. Using approximate token counts.")
+            _tokenizer = None
+    return _tokenizer
+
+
+class TokenChunker:
+    """
+    Packs sentences into chunks that fill, but never exceed, the embedding window.
+
+    - Token counts come from the embedding model's own tokenizer.
+    - Chunks break on sentence boundaries; headings start a new chunk once the
+      current one is reasonably full.
+    - The last `overlap_tokens` worth of sentences are repeated at the start of
+      the next chunk so context is not lost at the seams.
+    """
+
+    def __init__(self, max_tokens: int = None, overlap_tokens: int = None, tokenizer=None):
+        max_tokens = max_tokens or int(os.getenv("CHUNK_MAX_TOKENS", EMBEDDING_MAX_TOKENS))
+        self.budget = min(max_tokens, EMBEDDING_MAX_TOKENS) - SPECIAL_TOKENS
+        if overlap_tokens is None:
+            overlap_tokens = int(os.getenv("CHUNK_OVERLAP_TOKENS", 32))
+        # Overlap can never take up the whole window
+        self.overlap_tokens = max(0, min(overlap_tokens, self.budget // 2))
+        self.tokenizer = tokenizer if tokenizer is not None else get_tokenizer()
+        # Below this fill level a heading does not force a new chunk (avoids tiny chunks)
+        self.min_fill = self.budget // 2
+
+    def count_tokens(self, text: str) -> int:
+        if self.tokenizer is not None:
+            return len(self.tokenizer.encode(text, add_special_tokens=False))
+        # Word-pieces usually outnumber words; over-estimate to stay inside the window
+        return (len(APPROX_TOKEN_RE.findall(text)) * 4 + 2) // 3
+
+    def _split_oversized(self, sentence: str):
+        """Hard-split a single sentence that alone exceeds the budget."""
+        if self.tokenizer is not None and getattr(self.tokenizer, "is_fast", False):
+            enc = self.tokenizer(sentence, add_special_tokens=False, return_offsets_mapping=True)
+            offsets = enc["offset_mapping"]
+            for i in range(0, len(offsets), self.budget):
+                window = offsets[i:i + self.budget]
+                yield sentence[window[0][0]:window[-1][1]].strip()
+            return
+
+        words = sentence.split()
+        current = []
+        current_tokens = 0
+        for word in words:
+            word_tokens = self.count_tokens(word) + 1
+            if current and current_tokens + word_tokens > self.budget:
+                yield " ".join(current)
+                current, current_tokens = [], 0
+            current.append(word)
+            current_tokens += word_tokens
+        if current:
+            yield " ".join(current)
+
+    def _is_heading(self, line: str) -> bool:
+        stripped = line.strip()
+        if not stripped or stripped[-1] in ".!?;:,":
+            return False
+        return len(stripped.split()) <= 12
+
+    def _iter_units(self, text: str):
+        """Yield (sentence, token_count, starts_section) in document order."""
+        for line in text.splitlines():
+            line = line.strip()
+            if not line:
+                continue
+            starts_section = self._is_heading(line)
+            for sentence in SENTENCE_SPLIT_RE.split(line):
+                sentence = sentence.strip()
+                if not sentence:
+                    continue
+                tokens = self.count_tokens(sentence)
+                if tokens <= self.budget:
+                    yield sentence, tokens, starts_section
+                else:
+                    for piece in self._split_oversized(sentence):
+                        yield piece, self.count_tokens(piece), starts_section
+                        starts_section = False
+                starts_section = False
+
+    def iter_chunks(self, text: str):
+        current = []  # list of (sentence, tokens)
+        current_tokens = 0
+
+        for sentence, tokens, starts_section in self._iter_units(text):
+            # +1 for the joining space/newline token boundary
+            fits = current_tokens + tokens + (1 if current else 0) <= self.budget
+            section_break = starts_section and current_tokens >= self.min_fill
+
+            if current and (not fits or section_break):
+                yield "\n".join(s for s, _ in current)
+
+                # Carry trailing sentences forward as overlap, but not across a section break
+                carried = []
+                carried_tokens = 0
+                if not section_break:
+                    for s, t in reversed(current):
+                        if carried_tokens + t > self.overlap_tokens:
+                            break
+                        carried.insert(0, (s, t))
+                        carried_tokens += t + 1
+                # Overlap must leave room for the incoming sentence
+                while carried and carried_tokens + tokens > self.budget:
+                    carried_tokens -= carried.pop(0)[1] + 1
+                current, current_tokens = carried, max(0, carried_tokens)
+
+            current_tokens += tokens + (1 if current else 0)
+            current.append((sentence, tokens))
+
+        if current:
+            yield "\n".join(s for s, _ in current)
@@ -0,0 +1,69 @@
+"""
+Work claiming for the companies queue.
+
+A worker moves rows from 'pending' to 'processing' in one statement and commits,
+so the claim survives the per-company commits that follow and no other worker
+(thread, process or host) can pick the same rows. Rows stay 'processing' until
+they are marked completed/failed; claims whose worker died are released by
+release_stale_claims().
+"""
+import os
+import socket
+import uuid
+
+# Identifies this process in companies.claimed_by and batch_jobs.owner.
+# Set INSTANCE_ID to a stable value to let a restarted process release its own claims immediately.
+INSTANCE_ID = os.getenv("INSTANCE_ID") or f"{socket.gethostname()}-{os.getpid()}-{uuid.uuid4().hex[:8]}"
+
+# A claim older than this is assumed to belong to a dead worker
+CLAIM_TIMEOUT = int(os.getenv("CLAIM_TIMEOUT_SECONDS", 3600))
+
+CLAIM_SQL = """
+    UPDATE companies SET status = 'processing', claimed_by = %s, claimed_at = NOW()
+    WHERE id IN (
+        SELECT id FROM companies
+        WHERE status = 'pending'
+        ORDER BY created_at
+        LIMIT %s
+        FOR UPDATE SKIP LOCKED
+    )
+    RETURNING id, name, domain, created_at
+"""
+
+
+def claim_pending(conn, cursor, limit: int) -> list:
+    """Claim up to `limit` pending companies (oldest first) and commit. Returns the claimed rows."""
+    cursor.execute(CLAIM_SQL, (INSTANCE_ID, limit))
+    rows = cursor.fetchall()
+    conn.commit()
+    # RETURNING does not preserve the subquery's order
+    return sorted(rows, key=lambda r: r["created_at"])
+
+
+def claim_company(conn, cursor, company_id) -> bool:
+    """Claim one company regardless of its status, unless another worker holds it. Commits."""
+    cursor.execute("""
+        UPDATE companies SET status = 'processing', claimed_by = %s, claimed_at = NOW()
+        WHERE id = %s AND (status <> 'processing' OR claimed_by = %s)
+    """, (INSTANCE_ID, company_id, INSTANCE_ID))
+    claimed = cursor.rowcount == 1
+    conn.commit()
+    return claimed
+
+
+def release_stale_claims(conn, timeout: int = None) -> int:
+    """Put 'processing' rows from dead workers (or from an earlier run of this INSTANCE_ID) back to 'pending'."""
+    timeout = CLAIM_TIMEOUT if timeout is None else timeout
+    cursor = conn.cursor()
+    try:
+        cursor.execute("""
+            UPDATE companies SET status = 'pending', claimed_by = NULL, claimed_at = NULL
+            WHERE status = 'processing'
+            AND (claimed_by = %s OR claimed_at IS NULL OR claimed_at < NOW() - make_interval(secs => %s))
+        """, (INSTANCE_ID, timeout))
+        conn.commit()
+        if cursor.rowcount:
+            print(f"Released {cursor.rowcount} stale company claim(s)")
+        return cursor.rowcount
+    finally:
+        cursor.close()
@@ -0,0 +1,193 @@
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+try:
+    from .metrics import REGISTRY, Gauge, Counter
+except ImportError:
+    from metrics import REGISTRY, Gauge, Counter
+
+CONCURRENCY_LIMIT = REGISTRY.register(Gauge(
+    "policy_concurrency_limit", "Current adaptive in-flight limit", labels=("pool",)))
+CONCURRENCY_IN_FLIGHT = REGISTRY.register(Gauge(
+    "policy_concurrency_in_flight", "Requests currently in flight", labels=("pool",)))
+CONCURRENCY_BACKOFFS = REGISTRY.register(Counter(
+    "policy_concurrency_backoffs", "Multiplicative decreases triggered by overload signals", labels=("pool",)))
+
+
+class Slot:
+    """Handle returned by AIMDLimiter.slot(); callers flag the outcome before it is released."""
+
+    def __init__(self):
+        self.overloaded = False
+        self.failed = False
+        self.skipped = False
+
+    def mark_overloaded(self):
+        # Signs that the backend this limiter protects is saturated: LLM 429/503/timeouts,
+        # "model warming up", read timeouts from hosts that were answering
+        self.overloaded = True
+
+    def mark_failed(self):
+        # Other errors: count towards the error rate but don't cut on their own
+        self.failed = True
+
+    def mark_skipped(self):
+        # Released without doing any work: no latency or error sample
+        self.skipped = True
+
+
+class AIMDLimiter:
+    """
+    Additive-increase / multiplicative-decrease in-flight limit.
+
+    - Each window of `limit` healthy completions raises the limit by `increase`
+      (so growth is roughly +1 per round trip), as long as latency stays within
+      `latency_tolerance` x the baseline latency and the error rate stays low.
+    - The baseline is an EWMA of each window's fastest completion (weight
+      `baseline_weight`), so it follows the current mix of hosts/prompts instead of
+      being pinned by the fastest request ever seen.
+    - An overload signal cuts the limit by `decrease_factor` at once; further cuts
+      are suppressed for `cooldown` seconds so one burst of 429s counts once.
+    """
+
+    def __init__(self, name: str, initial: int, min_limit: int = 1, max_limit: int = 64,
+                 increase: int = 1, decrease_factor: float = 0.5, latency_tolerance: float = 2.0,
+                 max_error_rate: float = 0.2, cooldown: float = 5.0, baseline_weight: float = 0.2):
+        self.name = name
+        self.limit = max(min_limit, min(initial, max_limit))
+        self.min_limit = min_limit
+        self.max_limit = max_limit
+        self.increase = increase
+        self.decrease_factor = decrease_factor
+        self.latency_tolerance = latency_tolerance
+        self.max_error_rate = max_error_rate
+        self.cooldown = cooldown
+        self.baseline_weight = baseline_weight
+
+        self.in_flight = 0
+        self.baseline_latency = None
+        self.avg_latency = None
+        self._window_min = None
+        self._window_ok = 0
+        self._window_errors = 0
+        self._last_decrease = 0.0
+        self._cond = threading.Condition()
+        self._publish()
+
+    def _publish(self):
+        CONCURRENCY_LIMIT.set(self.limit, self.name)
+        CONCURRENCY_IN_FLIGHT.set(self.in_flight, self.name)
+
+    def acquire(self):
+        with self._cond:
+            while self.in_flight >= self.limit:
+                self._cond.wait()
+            self.in_flight += 1
+            self._publish()
+
+    def release(self, latency: float, overloaded: bool = False, failed: bool = False, skipped: bool = False):
+        with self._cond:
+            self.in_flight -= 1
+            if skipped:
+                pass
+            elif overloaded:
+                self._decrease()
+            else:
+                self._record(latency, failed)
+            self._publish()
+            self._cond.notify_all()
+
+    def _decrease(self):
+        now = time.monotonic()
+        if now - self._last_decrease < self.cooldown:
+            return
+        self._last_decrease = now
+        new_limit = max(self.min_limit, int(self.limit * self.decrease_factor))
+        if new_limit < self.limit:
+            print(f"INFO: {self.name} concurrency {self.limit} -> {new_limit} (overload)")
+        self.limit = new_limit
+        self._window_ok = self._window_errors = 0
+        self._window_min = None
+        CONCURRENCY_BACKOFFS.inc(self.name)
+
+    def _record(self, latency: float, failed: bool):
+        if failed:
+            self._window_errors += 1
+        else:
+            self._window_ok += 1
+            self._window_min = latency if self._window_min is None else min(self._window_min, latency)
+            self.avg_latency = latency if self.avg_latency is None else 0.8 * self.avg_latency + 0.2 * latency
+
+        completed = self._window_ok + self._window_errors
+        if completed < self.limit:
+            return
+
+        error_rate = self._window_errors / completed
+        slow = (self.baseline_latency is not None and self.avg_latency is not None
+                and self.avg_latency > self.baseline_latency * self.latency_tolerance)
+        if self._window_min is not None:
+            if self.baseline_latency is None:
+                self.baseline_latency = self._window_min
+            else:
+                w = self.baseline_weight
+                self.baseline_latency = (1 - w) * self.baseline_latency + w * self._window_min
+        self._window_ok = self._window_errors = 0
+        self._window_min = None
+
+        if error_rate > self.max_error_rate:
+            self._decrease()
+        elif not slow and self.in_flight + 1 >= self.limit:
+            # Only grow when the current limit is actually being used
+            self.limit = min(self.max_limit, self.limit + self.increase)
+
+    @contextmanager
+    def slot(self):
+        self.acquire()
+        handle = Slot()
+        start = time.perf_counter()
+        try:
+            yield handle
+        except Exception:
+            handle.failed = True
+            raise
+        finally:
+            self.release(time.perf_counter() - start, handle.overloaded, handle.failed, handle.skipped)
+
+    def snapshot(self) -> dict:
+        with self._cond:
+            return {
+                "limit": self.limit,
+                "in_flight": self.in_flight,
+                "avg_latency_seconds": round(self.avg_latency, 4) if self.avg_latency is not None else None,
+                "baseline_latency_seconds": round(self.baseline_latency, 4) if self.baseline_latency is not None else None,
+            }
+
+
+# Separate controllers: page fetches and LLM inference saturate very different backends
+FETCH_LIMITER = AIMDLimiter(
+    "fetch",
+    initial=int(os.getenv("FETCH_CONCURRENCY_INITIAL", 8)),
+    min_limit=int(os.getenv("FETCH_CONCURRENCY_MIN", 1)),
+    max_limit=int(os.getenv("FETCH_CONCURRENCY_MAX", 64)),
+    # Dead domains and refused connections are common in company lists and say
+    # nothing about load; only a clear majority of failures should cut the limit
+    max_error_rate=0.5,
+)
+LLM_LIMITER = AIMDLimiter(
+    "llm",
+    initial=int(os.getenv("LLM_CONCURRENCY_INITIAL", 2)),
+    min_limit=int(os.getenv("LLM_CONCURRENCY_MIN", 1)),
+    max_limit=int(os.getenv("LLM_CONCURRENCY_MAX", 16)),
+    # LLM latency varies a lot with prompt size; be more tolerant before holding growth
+    latency_tolerance=3.0,
+)
+
+def is_overload_error(error) -> bool:
+    text = str(error).lower()
+    return any(marker in text for marker in ("429", "503", "too many requests", "timed out", "timeout",
+                                             "model_pending_deploy", "overloaded"))
+
+def snapshot() -> dict:
+    return {"fetch": FETCH_LIMITER.snapshot(), "llm": LLM_LIMITER.snapshot()}
@@ -0,0 +1,125 @@
+import hashlib
+import os
+import threading
+from collections import OrderedDict
+from urllib.parse import urlsplit, urlunsplit, parse_qsl, urlencode
+
+def normalize_url(url: str) -> str:
+    """
+    Canonical form used as the URL-level dedup key:
+    lower-cased scheme/host, no fragment, no tracking params, no trailing slash.
+    """
+    if not url:
+        return url
+    if not url.startswith('http'):
+        url = 'https://' + url
+    parts = urlsplit(url)
+    host = parts.netloc.lower()
+    if host.startswith('www.'):
+        host = host[4:]
+    query = urlencode(sorted(
+        (k, v) for k, v in parse_qsl(parts.query, keep_blank_values=True)
+        if not k.lower().startswith('utm_')
+    ))
+    path = parts.path.rstrip('/') or '/'
+    # http and https versions of a page are the same document for our purposes
+    return urlunsplit(('https', host, path, query, ''))
+
+def content_hash(text: str) -> str:
+    # Whitespace-insensitive so trivial formatting differences still dedupe
+    normalized = ' '.join(text.split())
+    return hashlib.sha256(normalized.encode('utf-8')).hexdigest()
+
+
+class PolicyDocumentIndex:
+    """
+    Per-run dedup index so a policy document shared by several companies
+    (parent companies, hosted legal pages, Google properties) is fetched,
+    embedded and run through the LLM only once.
+
+    - url_index:   normalized URL  -> content hash ('' when the fetch returned nothing)
+    - baselines:   normalized URL  -> hash of the static (unrendered) text, the recrawler's
+                   change-detection baseline; only differs from url_index for rendered pages
+    - documents:   content hash    -> chunks of that document
+    - extractions: set of hashes   -> (scopes, enrichment) for that combination of documents
+
+    Chunk lists are the bulk of the memory, so at most `max_documents` are kept
+    (oldest evicted first); an evicted document is simply fetched and chunked again.
+    """
+
+    def __init__(self, max_documents: int = None):
+        self.max_documents = max_documents or int(os.getenv("DEDUP_MAX_DOCUMENTS", 5000))
+        self.url_index = {}
+        self.baselines = {}
+        self.documents = OrderedDict()
+        self.extractions = {}
+        self.stats = {"url_hits": 0, "content_hits": 0, "extraction_hits": 0}
+        self._lock = threading.Lock()
+
+    def lookup_url(self, url: str):
+        """Returns (content_hash, chunks) for an already-seen URL, else None."""
+        key = normalize_url(url)
+        with self._lock:
+            if key not in self.url_index:
+                return None
+            doc_hash = self.url_index[key]
+            if doc_hash and doc_hash not in self.documents:
+                # Chunks were evicted; treat as unseen
+                return None
+            self.stats["url_hits"] += 1
+            return doc_hash, self.documents.get(doc_hash, [])
+
+    def baseline_hash(self, url: str):
+        """Hash of the URL's static text (None if it had none), for storing in policy_pages.content_hash."""
+        with self._lock:
+            return self.baselines.get(normalize_url(url))
+
+    def add_document(self, url: str, text: str, chunker, static_text: str = None):
+        """
+        Registers a freshly fetched document. Returns (content_hash, chunks, is_new);
+        is_new is False when identical content was already seen under another URL,
+        in which case the caller should not embed it again.
+        static_text: the plain fetch's text when `text` came from the browser renderer.
+        chunker(text) is only called for content not seen before, so it may also embed.
+        """
+        key = normalize_url(url)
+        static_text = text if static_text is None else static_text
+        with self._lock:
+            self.baselines[key] = content_hash(static_text) if static_text else None
+        if not text:
+            with self._lock:
+                self.url_index[key] = ''
+            return '', [], False
+
+        doc_hash = content_hash(text)
+        with self._lock:
+            self.url_index[key] = doc_hash
+            if doc_hash in self.documents:
+                self.stats["content_hits"] += 1
+                return doc_hash, self.documents[doc_hash], False
+
+        chunks = chunker(text)
+        with self._lock:
+            # Another worker may have raced us to the same content
+            if doc_hash in self.documents:
+                self.stats["content_hits"] += 1
+                return doc_hash, self.documents[doc_hash], False
+            self.documents[doc_hash] = chunks
+            while len(self.documents) > self.max_documents:
+                self.documents.popitem(last=False)
+        return doc_hash, chunks, True
+
+    def get_extraction(self, doc_hashes):
+        key = frozenset(h for h in doc_hashes if h)
+        with self._lock:
+            if key in self.extractions:
+                self.stats["extraction_hits"] += 1
+                return self.extractions[key]
+        return None
+
+    def set_extraction(self, doc_hashes, scopes: dict, enrichment: dict):
+        key = frozenset(h for h in doc_hashes if h)
+        if not key:
+            return
+        with self._lock:
+            self.extractions[key] = (scopes, enrichment)
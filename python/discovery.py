@@ -12,14 +12,28 @@ class Discovery:
 
     def find_policy_links(self, domain: str) -> dict:
         base_url = f"https://{domain}"
-        html = self.scraper.fetch_page(base_url)
-        if not html:
+        fetched = self.scraper.fetch_document(base_url)
+        if not fetched["text"]:
              base_url = f"http://{domain}"
-             html = self.scraper.fetch_page(base_url)
+             fetched = self.scraper.fetch_document(base_url)
+        html = fetched["text"]
         
         if not html:
             return {"privacy": None, "terms": None}
 
+        discovered = self._extract_links(html, base_url)
+
+        # SPA homepages often ship no links in the static HTML; render once if we found nothing
+        # and the page looks like a JS shell (a normal page without policy links stays unrendered)
+        if (not discovered["privacy"] and not discovered["terms"] and self.scraper.renderer is not None
+                and self.scraper.needs_rendering(self.scraper.clean_text(html), fetched)):
+            rendered = self.scraper.render_page(base_url)
+            if rendered:
+                discovered = self._extract_links(rendered, base_url)
+
+        return discovered
+
+    def _extract_links(self, html: str, base_url: str) -> dict:
         soup = BeautifulSoup(html, 'html.parser')
         links = soup.find_all('a', href=True)
         
@@ -0,0 +1,199 @@
+"""
+Memory-bounded streaming export of processed results.
+
+Rows are read from Postgres through a server-side (named) cursor and written out
+incrementally as CSV, NDJSON or Parquet, so memory stays flat regardless of table size.
+Columns match List1.csv plus the scope flags; `since` limits the export to
+companies whose data changed after that timestamp.
+
+Usage:
+    python export.py --format csv --output results.csv
+    python export.py --format parquet --since 2024-01-01T00:00:00 --output delta.parquet
+"""
+import argparse
+import csv
+import io
+import json
+import os
+import sys
+from datetime import datetime
+
+import psycopg2
+
+LIST1_COLUMNS = ["id", "name", "generic_email", "contact_email", "privacy_email", "delete_link", "domain", "country"]
+SCOPE_COLUMNS = ["scope_registration", "scope_legal", "scope_customization", "scope_marketing", "scope_security"]
+EXPORT_COLUMNS = LIST1_COLUMNS + SCOPE_COLUMNS + ["updated_at"]
+FORMATS = ("csv", "ndjson", "parquet")
+MEDIA_TYPES = {
+    "csv": "text/csv",
+    "ndjson": "application/x-ndjson",
+    "parquet": "application/vnd.apache.parquet",
+}
+
+# Rows fetched per round trip from the named cursor, and rows per output chunk / Parquet row group
+FETCH_SIZE = int(os.getenv("EXPORT_FETCH_SIZE", 5000))
+
+EXPORT_QUERY = """
+    SELECT c.id, c.name, c.generic_email, c.contact_email, c.privacy_email, c.delete_link, c.domain, c.country,
+           s.scope_registration, s.scope_legal, s.scope_customization, s.scope_marketing, s.scope_security,
+           GREATEST(COALESCE(c.processed_at, c.created_at), s.last_updated) AS updated_at
+    FROM companies c
+    LEFT JOIN policy_scopes s ON s.company_id = c.id
+    WHERE c.status = 'completed'
+"""
+
+def get_db_connection():
+    return psycopg2.connect(os.getenv("DATABASE_URL"))
+
+def parse_since(value: str) -> datetime:
+    """
+    ISO-8601 timestamp for `since`; raises ValueError when malformed.
+    Validate before streaming starts: once the response has begun, a bad value can
+    only cut the download short.
+    """
+    if value.endswith("Z"):
+        value = value[:-1] + "+00:00"
+    return datetime.fromisoformat(value)
+
+def iter_row_batches(conn, since=None, fetch_size: int = FETCH_SIZE):
+    """Yield lists of row tuples from a server-side cursor (never the whole result set)."""
+    query = EXPORT_QUERY
+    params = ()
+    if since:
+        # processed_at alone is sargable (idx_companies_processed_at). It also covers scope
+        # changes: the pipeline writes policy_scopes in the same transaction that sets processed_at.
+        query += " AND c.processed_at > %s"
+        params = (since,)
+    query += " ORDER BY c.id"
+
+    # Named cursor => rows stay on the server until fetched
+    cursor = conn.cursor(name="results_export")
+    cursor.itersize = fetch_size
+    try:
+        cursor.execute(query, params)
+        while True:
+            rows = cursor.fetchmany(fetch_size)
+            if not rows:
+                break
+            yield rows
+    finally:
+        cursor.close()
+
+def _serialize(value):
+    if hasattr(value, "isoformat"):
+        return value.isoformat()
+    return value
+
+
+def _csv_chunks(batches):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(EXPORT_COLUMNS)
+    for rows in batches:
+        writer.writerows([_serialize(v) for v in row] for row in rows)
+        yield buffer.getvalue().encode("utf-8")
+        buffer.seek(0)
+        buffer.truncate()
+    if buffer.tell():
+        yield buffer.getvalue().encode("utf-8")
+
+def _ndjson_chunks(batches):
+    for rows in batches:
+        lines = (json.dumps(dict(zip(EXPORT_COLUMNS, map(_serialize, row))), default=str) for row in rows)
+        yield ("\n".join(lines) + "\n").encode("utf-8")
+
+
+class _DrainableSink(io.RawIOBase):
+    """Write-only, non-seekable sink whose buffered bytes can be drained after each row group."""
+
+    def __init__(self):
+        self._chunks = []
+        self._position = 0
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        self._chunks.append(bytes(data))
+        self._position += len(data)
+        return len(data)
+
+    def tell(self):
+        return self._position
+
+    def drain(self) -> bytes:
+        data = b"".join(self._chunks)
+        self._chunks = []
+        return data
+
+def _parquet_chunks(batches):
+    try:
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+    except ImportError:
+        raise RuntimeError("Parquet export requires pyarrow (pip install pyarrow)")
+
+    schema = pa.schema(
+        [(c, pa.string()) for c in LIST1_COLUMNS]
+        + [(c, pa.bool_()) for c in SCOPE_COLUMNS]
+        + [("updated_at", pa.timestamp("us"))]
+    )
+    sink = _DrainableSink()
+    writer = pq.ParquetWriter(sink, schema)
+    try:
+        for rows in batches:
+            # One row group per fetched batch; the batch is released right after
+            columns = list(zip(*rows))
+            table = pa.Table.from_arrays([pa.array(col, type=field.type) for col, field in zip(columns, schema)], schema=schema)
+            writer.write_table(table)
+            data = sink.drain()
+            if data:
+                yield data
+    finally:
+        writer.close()
+    yield sink.drain()
+
+def stream_export(fmt: str = "csv", since=None, conn=None):
+    """Generator of encoded byte chunks for the requested format."""
+    if fmt not in FORMATS:
+        raise ValueError(f"Unsupported export format '{fmt}', expected one of {FORMATS}")
+    own_conn = conn is None
+    if own_conn:
+        conn = get_db_connection()
+    try:
+        batches = iter_row_batches(conn, since)
+        if fmt == "csv":
+            yield from _csv_chunks(batches)
+        elif fmt == "ndjson":
+            yield from _ndjson_chunks(batches)
+        else:
+            yield from _parquet_chunks(batches)
+    finally:
+        if own_conn:
+            conn.close()
+
+
+def _since_arg(value: str) -> datetime:
+    try:
+        return parse_since(value)
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"invalid ISO timestamp: {value!r}")
+
+def main():
+    parser = argparse.ArgumentParser(description="Stream processed results as CSV, NDJSON or Parquet")
+    parser.add_argument("--format", choices=FORMATS, default="csv")
+    parser.add_argument("--since", type=_since_arg, help="only companies changed after this ISO timestamp")
+    parser.add_argument("--output", help="output file (default: stdout)")
+    args = parser.parse_args()
+
+    out = open(args.output, "wb") if args.output else sys.stdout.buffer
+    try:
+        for chunk in stream_export(args.format, args.since):
+            out.write(chunk)
+    finally:
+        if args.output:
+            out.close()
+
+
+if __name__ == "__main__":
+    main()
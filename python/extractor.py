@@ -5,11 +5,23 @@ from langchain_core.output_parsers import JsonOutputParser
 
 try:
     from .models import CompanyData
+    from .metrics import timed
+    from .concurrency import LLM_LIMITER, is_overload_error
 except ImportError:
     from models import CompanyData
+    from metrics import timed
+    from concurrency import LLM_LIMITER, is_overload_error
 import json
 import os
+import threading
 import time
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+
+SCOPE_KEYS = ["scope_registration", "scope_legal", "scope_customization", "scope_marketing", "scope_security"]
+ENRICHMENT_KEYS = ["generic_email", "contact_email", "privacy_email", "delete_link", "country"]
+EMAIL_KEYS = {"generic_email", "contact_email", "privacy_email"}
+# Placeholder answers the model gives instead of null
+EMPTY_VALUES = {"", "null", "none", "n/a", "na", "not found", "unknown", "not specified", "not provided"}
 
 class Extractor:
     def __init__(self):
@@ -38,24 +50,115 @@ class Extractor:
              base_url = os.getenv("OLLAMA_URL", "http://localhost:11434")
              self.llm = ChatOllama(model="qwen3-vl:4b", temperature=0, base_url=base_url)
 
-    def _invoke_with_retry(self, chain, input_data, max_retries=3, delay=20):
+        # "map_reduce" walks every chunk in groups; "head" only looks at the first group (legacy)
+        self.mode = os.getenv("EXTRACTION_MODE", "map_reduce")
+        self.chunks_per_group = int(os.getenv("EXTRACTION_CHUNKS_PER_GROUP", 5))
+        self.max_concurrency = int(os.getenv("EXTRACTION_CONCURRENCY", 4))
+
+    def _invoke_with_retry(self, chain, input_data, max_retries=3, delay=20, stop=None):
+        """`stop`: optional threading.Event; once set, no further request is sent (returns None)."""
         for attempt in range(max_retries):
+            if stop is not None and stop.is_set():
+                return None
             try:
-                return chain.invoke(input_data)
+                # The adaptive limiter bounds in-flight calls to the Ollama/HF backend
+                with LLM_LIMITER.slot() as slot:
+                    # Re-check after waiting for a slot: the answer may be complete by now
+                    if stop is not None and stop.is_set():
+                        slot.mark_skipped()
+                        return None
+                    try:
+                        with timed("llm_call"):
+                            return chain.invoke(input_data)
+                    except Exception as e:
+                        if is_overload_error(e):
+                            slot.mark_overloaded()
+                        raise
             except Exception as e:
                 error_str = str(e)
                 if "model_pending_deploy" in error_str or "503" in error_str:
                     print(f"WARNING: Model is warming up (Attempt {attempt+1}/{max_retries}). Waiting {delay}s...")
-                    time.sleep(delay)
+                    if stop is not None:
+                        stop.wait(delay)
+                    else:
+                        time.sleep(delay)
                 else:
                     raise e
         raise Exception("Max retries exceeded for model inference")
 
+    def _chunk_groups(self, chunks: list[str]) -> list[str]:
+        if self.mode == "head":
+            return ["\n\n".join(chunks[:self.chunks_per_group])]
+        size = max(1, self.chunks_per_group)
+        return ["\n\n".join(chunks[i:i+size]) for i in range(0, len(chunks), size)]
+
+    def _map_reduce(self, chain, groups: list[str], merge, is_complete):
+        """
+        Map: run `chain` over each group of chunks, at most `max_concurrency` at a time,
+        submitting groups in document order.
+        Reduce: feed every result to `merge(index, result)` as it arrives.
+        Stops submitting (and drops queued groups) as soon as `is_complete()` is True,
+        so the cost is bounded by how early the answers appear, not by document length.
+        Groups still waiting for an LLM slot are dropped too (see `stop`); requests that
+        were already sent are not aborted and run to completion in the background.
+        Returns the number of groups that succeeded.
+        """
+        succeeded = 0
+        stop = threading.Event()
+        next_group = 0
+        pending = {}
+        executor = ThreadPoolExecutor(max_workers=max(1, min(self.max_concurrency, len(groups))))
+        try:
+            while next_group < len(groups) or pending:
+                while next_group < len(groups) and len(pending) < self.max_concurrency and not is_complete():
+                    future = executor.submit(self._invoke_with_retry, chain, {"context": groups[next_group]}, stop=stop)
+                    pending[future] = next_group
+                    next_group += 1
+
+                if not pending:
+                    break
+
+                done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    index = pending.pop(future)
+                    try:
+                        result = future.result()
+                    except Exception as e:
+                        print(f"Extraction error on chunk group {index}: {e}")
+                        continue
+                    if isinstance(result, dict):
+                        merge(index, result)
+                        succeeded += 1
+
+                if is_complete():
+                    print(f"INFO: Early termination after {next_group}/{len(groups)} chunk groups")
+                    break
+        finally:
+            # Don't wait for in-flight groups whose answers are no longer needed, and keep
+            # the ones still queued for an LLM slot from sending their request at all
+            stop.set()
+            executor.shutdown(wait=False, cancel_futures=True)
+        return succeeded
+
+    @staticmethod
+    def _as_bool(value) -> bool:
+        if isinstance(value, str):
+            return value.strip().lower() == "true"
+        return value is True
+
+    @staticmethod
+    def _confident_value(key: str, value):
+        if value is None or isinstance(value, (bool, dict, list)):
+            return None
+        value = str(value).strip()
+        if value.lower() in EMPTY_VALUES:
+            return None
+        if key in EMAIL_KEYS and "@" not in value:
+            return None
+        return value
+
     def extract_scopes(self, chunks: list[str]) -> dict:
-        # Simplistic approach: Concatenate top chunks and ask LLM
-        # For production: Map-Reduce or refinement loop
-        context = "\n\n".join(chunks[:5]) # Limit context window
-        
+        # Map-reduce over all chunks: a scope applies if any group says it does (OR)
         prompt = ChatPromptTemplate.from_template("""
         You are a legal expert. Analyze the following policy text excerpts and determine if the following scopes apply (True/False).
         
@@ -74,23 +177,23 @@ class Extractor:
         """)
         
         chain = prompt | self.llm | JsonOutputParser()
-        
+
+        scopes = {key: False for key in SCOPE_KEYS}
+
+        def merge(index, result):
+            for key in SCOPE_KEYS:
+                if self._as_bool(result.get(key)):
+                    scopes[key] = True
+
         try:
-            return self._invoke_with_retry(chain, {"context": context})
+            self._map_reduce(chain, self._chunk_groups(chunks), merge,
+                             lambda: all(scopes.values()))
         except Exception as e:
             print(f"Extraction error: {e}")
-            # Fallback
-            return {
-                "scope_registration": False,
-                "scope_legal": False,
-                "scope_customization": False,
-                "scope_marketing": False,
-                "scope_security": False
-            }
+        # Fallback is all False, same as before
+        return scopes
 
     def enrich_company_data(self, chunks: list[str], current_data: CompanyData) -> dict:
-        context = "\n\n".join(chunks[:5])
-        
         prompt = ChatPromptTemplate.from_template("""
         Extract the following information from the policy text if present:
         - generic_email
@@ -106,12 +209,23 @@ class Extractor:
         """)
         
         chain = prompt | self.llm | JsonOutputParser()
-        
+
+        # key -> (group index, value); the earliest group in document order wins
+        found = {}
+
+        def merge(index, result):
+            for key in ENRICHMENT_KEYS:
+                value = self._confident_value(key, result.get(key))
+                if value is not None and (key not in found or index < found[key][0]):
+                    found[key] = (index, value)
+
         try:
-            enrichment = self._invoke_with_retry(chain, {"context": context})
-            # Merge with existing data if new data is found
-            # This logic can be refined
-            return enrichment
+            succeeded = self._map_reduce(chain, self._chunk_groups(chunks), merge,
+                                         lambda: len(found) == len(ENRICHMENT_KEYS))
         except Exception as e:
             print(f"Enrichment error: {e}")
             return {}
+
+        if not succeeded:
+            return {}
+        return {key: found[key][1] if key in found else None for key in ENRICHMENT_KEYS}
@@ -0,0 +1,244 @@
+import json
+import os
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+import psycopg2
+from psycopg2.extras import RealDictCursor
+
+try:
+    from .dedup import PolicyDocumentIndex
+    from .claims import INSTANCE_ID
+except ImportError:
+    from dedup import PolicyDocumentIndex
+    from claims import INSTANCE_ID
+
+TERMINAL_STATUSES = ("completed", "failed")
+HEARTBEAT_INTERVAL = float(os.getenv("JOB_HEARTBEAT_SECONDS", 30))
+# An unfinished job whose owner has not sent a heartbeat for this long is treated as orphaned
+HEARTBEAT_TIMEOUT = float(os.getenv("JOB_HEARTBEAT_TIMEOUT_SECONDS", 5 * HEARTBEAT_INTERVAL))
+
+class JobManager:
+    """
+    Runs batch processing as background jobs instead of inside the HTTP request.
+
+    - submit() records a row in batch_jobs and returns its id immediately
+    - a worker thread drains pending companies in small batches
+    - every company result is written to batch_job_results as soon as it is committed,
+      so nothing accumulates in memory and progress can be polled or streamed
+    - jobs are owned by this process (batch_jobs.owner = INSTANCE_ID) and kept alive by a
+      heartbeat, so a restart only fails jobs whose owner is gone
+    """
+
+    def __init__(self, processor_factory, max_workers: int = None, batch_size: int = None):
+        self.processor_factory = processor_factory
+        self.batch_size = batch_size or int(os.getenv("JOB_BATCH_SIZE", 10))
+        self._executor = ThreadPoolExecutor(max_workers=max_workers or int(os.getenv("JOB_WORKERS", 1)))
+        self._local = threading.local()
+        self._factory_lock = threading.Lock()
+        self._heartbeat_thread = None
+
+    def get_db_connection(self):
+        return psycopg2.connect(os.getenv("DATABASE_URL"))
+
+    def _get_processor(self):
+        # Model/embedding init is heavy, so each worker thread reuses its processor across jobs.
+        # A BatchProcessor is not shared between threads.
+        processor = getattr(self._local, "processor", None)
+        if processor is None:
+            with self._factory_lock:
+                processor = self._local.processor = self.processor_factory()
+        return processor
+
+    def fail_interrupted_jobs(self) -> int:
+        """
+        Mark unfinished jobs whose owner is gone as failed. Call once at startup.
+        A job is orphaned if it belongs to an earlier run of this INSTANCE_ID, predates job
+        ownership, or its owner stopped sending heartbeats; jobs of other live servers are left alone.
+        """
+        conn = self.get_db_connection()
+        cursor = conn.cursor()
+        try:
+            cursor.execute("""
+                UPDATE batch_jobs SET status = 'failed', error_message = 'Interrupted by server restart', finished_at = NOW()
+                WHERE status IN ('queued', 'running')
+                AND (owner = %s OR owner IS NULL OR heartbeat_at IS NULL
+                     OR heartbeat_at < NOW() - make_interval(secs => %s))
+            """, (INSTANCE_ID, HEARTBEAT_TIMEOUT))
+            conn.commit()
+            if cursor.rowcount:
+                print(f"Marked {cursor.rowcount} interrupted job(s) as failed")
+            return cursor.rowcount
+        finally:
+            cursor.close()
+            conn.close()
+
+    def _ensure_heartbeat(self):
+        with self._factory_lock:
+            if self._heartbeat_thread is None:
+                self._heartbeat_thread = threading.Thread(target=self._heartbeat_loop, name="job-heartbeat", daemon=True)
+                self._heartbeat_thread.start()
+
+    def _heartbeat_loop(self):
+        while True:
+            time.sleep(HEARTBEAT_INTERVAL)
+            try:
+                conn = self.get_db_connection()
+                try:
+                    cursor = conn.cursor()
+                    cursor.execute("UPDATE batch_jobs SET heartbeat_at = NOW() WHERE owner = %s AND status IN ('queued', 'running')",
+                                   (INSTANCE_ID,))
+                    conn.commit()
+                    cursor.close()
+                finally:
+                    conn.close()
+            except Exception as e:
+                print(f"Warning: job heartbeat failed: {e}")
+
+    def submit(self, limit: int, csv_path: str = None) -> dict:
+        job_id = str(uuid.uuid4())
+        conn = self.get_db_connection()
+        cursor = conn.cursor()
+        try:
+            cursor.execute("""
+                INSERT INTO batch_jobs (id, status, requested_limit, csv_path, owner, heartbeat_at)
+                VALUES (%s, 'queued', %s, %s, %s, NOW())
+            """, (job_id, limit, csv_path, INSTANCE_ID))
+            conn.commit()
+        finally:
+            cursor.close()
+            conn.close()
+
+        self._ensure_heartbeat()
+        self._executor.submit(self._run, job_id, limit, csv_path)
+        return {"job_id": job_id, "status": "queued"}
+
+    def _set_status(self, conn, job_id, status, error=None):
+        cursor = conn.cursor()
+        if status == "running":
+            cursor.execute("UPDATE batch_jobs SET status = %s, started_at = NOW() WHERE id = %s", (status, job_id))
+        else:
+            cursor.execute("UPDATE batch_jobs SET status = %s, error_message = %s, finished_at = NOW() WHERE id = %s",
+                           (status, error, job_id))
+        conn.commit()
+        cursor.close()
+
+    def _record_result(self, conn, job_id, item):
+        cursor = conn.cursor()
+        durations = item.get("stage_durations") or {}
+        cursor.execute("""
+            INSERT INTO batch_job_results (job_id, company_id, domain, status, error, privacy_url, terms_url, scopes_found, emails_found, duration_seconds)
+            VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
+        """, (job_id, item.get("id"), item.get("domain"), item.get("status"), item.get("error"),
+              item.get("privacy_url"), item.get("terms_url"), item.get("scopes_found"), item.get("emails_found"),
+              sum(durations.values()) if durations else None))
+        cursor.execute("""
+            UPDATE batch_jobs SET
+            processed = processed + 1,
+            successful = successful + %s,
+            failed = failed + %s
+            WHERE id = %s
+        """, (1 if item.get("status") == "completed" else 0, 1 if item.get("status") == "failed" else 0, job_id))
+        conn.commit()
+        cursor.close()
+
+    def _run(self, job_id, limit, csv_path):
+        conn = self.get_db_connection()
+        try:
+            self._set_status(conn, job_id, "running")
+            processor = self._get_processor()
+
+            if csv_path:
+                import_result = processor.import_csv_to_db(csv_path)
+                if import_result["status"] != "completed":
+                    self._set_status(conn, job_id, "failed", import_result["message"])
+                    return
+
+            # One dedup index for the whole job, so shared policies dedupe across all its batches
+            doc_index = PolicyDocumentIndex()
+            remaining = limit
+            while remaining > 0:
+                summary = processor.process_pending_companies(
+                    limit=min(self.batch_size, remaining),
+                    on_result=lambda item: self._record_result(conn, job_id, item),
+                    collect_details=False,
+                    doc_index=doc_index,
+                )
+                processed = summary.get("total_processed", 0)
+                if not processed:
+                    break
+                remaining -= processed
+
+            self._set_status(conn, job_id, "completed")
+        except Exception as e:
+            print(f"Job {job_id} failed: {e}")
+            try:
+                conn.rollback()
+                self._set_status(conn, job_id, "failed", str(e))
+            except Exception:
+                pass
+        finally:
+            conn.close()
+
+    def get_job(self, job_id: str):
+        conn = self.get_db_connection()
+        cursor = conn.cursor(cursor_factory=RealDictCursor)
+        try:
+            cursor.execute("""
+                SELECT id, status, requested_limit, csv_path, processed, successful, failed, error_message,
+                       created_at, started_at, finished_at
+                FROM batch_jobs WHERE id = %s
+            """, (job_id,))
+            return cursor.fetchone()
+        finally:
+            cursor.close()
+            conn.close()
+
+    def get_results(self, job_id: str, after_id: int = 0, limit: int = 100) -> list:
+        conn = self.get_db_connection()
+        cursor = conn.cursor(cursor_factory=RealDictCursor)
+        try:
+            cursor.execute("""
+                SELECT id, company_id, domain, status, error, privacy_url, terms_url, scopes_found, emails_found,
+                       duration_seconds, created_at
+                FROM batch_job_results WHERE job_id = %s AND id > %s
+                ORDER BY id LIMIT %s
+            """, (job_id, after_id, limit))
+            return cursor.fetchall()
+        finally:
+            cursor.close()
+            conn.close()
+
+    def stream(self, job_id: str, fmt: str = "ndjson", poll_interval: float = 1.0):
+        """
+        Generator of progress events until the job finishes.
+        fmt="ndjson": one JSON object per line; fmt="sse": text/event-stream frames.
+        Each poll emits any new per-company results, then a progress snapshot.
+        """
+        def encode(event_type, data):
+            payload = json.dumps({"type": event_type, **data}, default=str)
+            if fmt == "sse":
+                return f"event: {event_type}\ndata: {payload}\n\n"
+            return payload + "\n"
+
+        last_result_id = 0
+        while True:
+            job = self.get_job(job_id)
+            if job is None:
+                yield encode("error", {"message": f"Job {job_id} not found"})
+                return
+
+            while True:
+                results = self.get_results(job_id, after_id=last_result_id, limit=500)
+                for result in results:
+                    last_result_id = result["id"]
+                    yield encode("result", dict(result))
+                if len(results) < 500:
+                    break
+
+            yield encode("progress", dict(job))
+            if job["status"] in TERMINAL_STATUSES:
+                return
+            time.sleep(poll_interval)
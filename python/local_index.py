@@ -0,0 +1,338 @@
+"""
+Embedded vector index, an in-process alternative to the Qdrant server.
+
+Layout under `path` (one directory per collection):
+    vectors.f32   row-major float32 matrix of unit-normalised vectors, memory-mapped for search
+    payloads.db   sqlite: row number -> point id + payload. The fields filters use most
+                  (domain, company_id, type, url) are indexed columns; the rest of the
+                  payload (chunk text, extras) is a JSON blob
+
+Cosine similarity is a dot product on the normalised rows. Up to `exact_threshold`
+candidate rows, search is exact (one matrix-vector product). Above that, an HNSW
+index is used if hnswlib is installed; it is built lazily in memory from the mapped
+matrix. Without hnswlib, search stays exact.
+
+Row numbers are never reused: deleted points leave a hole in vectors.f32 that is
+masked out of searches. sqlite is the source of truth for which rows exist.
+
+Use get_local_index() so all users of a path in one process share one instance.
+Separate processes may open the same path: writes are serialised by the sqlite
+write lock, and every add/search first picks up rows and deletions made elsewhere.
+With path=None, everything is kept in memory.
+"""
+import json
+import os
+import sqlite3
+import threading
+
+import numpy as np
+
+try:
+    import hnswlib
+except ImportError:
+    hnswlib = None
+
+EXACT_SEARCH_THRESHOLD = int(os.getenv("VECTOR_EXACT_THRESHOLD", 20000))
+# Extra candidates pulled from the ANN index when a payload filter has to be applied afterwards
+ANN_FILTER_OVERSAMPLE = 10
+
+# Payload key -> indexed column. Other keys are filtered with json_extract on the blob.
+INDEXED_FIELDS = (("domain", "domain"), ("company_id", "company_id"), ("type", "doc_type"), ("url", "url"))
+INDEXED_COLUMNS = dict(INDEXED_FIELDS)
+# Columns are declared without a type so sqlite keeps values as given (1 and "1" stay different)
+POINT_COLUMNS = "row, id, " + ", ".join(column for _, column in INDEXED_FIELDS) + ", payload"
+
+
+def _normalize(vectors: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return vectors / norms
+
+
+def _is_column_value(value) -> bool:
+    # bool is kept in the blob: sqlite would hand it back as an int
+    return isinstance(value, (str, int, float)) and not isinstance(value, bool)
+
+
+def _split_payload(payload: dict):
+    """(indexed column values, JSON blob of the remaining keys)"""
+    rest = dict(payload)
+    columns = [rest.pop(key) if _is_column_value(rest.get(key)) else None for key, _ in INDEXED_FIELDS]
+    return columns, json.dumps(rest, default=str)
+
+
+def _join_payload(columns, blob: str) -> dict:
+    payload = json.loads(blob) if blob else {}
+    for (key, _), value in zip(INDEXED_FIELDS, columns):
+        if value is not None:
+            payload[key] = value
+    return payload
+
+
+class LocalVectorIndex:
+    def __init__(self, path: str = None, exact_threshold: int = None):
+        self.path = path
+        self.exact_threshold = exact_threshold if exact_threshold is not None else EXACT_SEARCH_THRESHOLD
+        self._lock = threading.RLock()
+
+        if path:
+            os.makedirs(path, exist_ok=True)
+            self._vectors_path = os.path.join(path, "vectors.f32")
+            db_path = os.path.join(path, "payloads.db")
+        else:
+            self._vectors_path = None
+            db_path = ":memory:"
+        # Autocommit mode: transactions are explicit (BEGIN IMMEDIATE around writes)
+        self._db = sqlite3.connect(db_path, timeout=30, check_same_thread=False, isolation_level=None)
+        if path:
+            self._db.execute("PRAGMA journal_mode=WAL")
+        self._migrate()
+
+        self.dim = None
+        self.count = 0        # rows allocated in the vectors matrix (including deleted ones)
+        self._version = 0     # bumped in meta by every delete
+        self._alive = None    # boolean mask over rows once anything was deleted, else None
+        self._alive_count = 0
+
+        self._blocks = []     # in-memory mode: added vector batches, concatenated on demand
+        self._matrix = None   # cached (count x dim) view, reset when count changes
+        self._ann = None
+        self._ann_count = 0
+        self._sync()
+
+    def _migrate(self):
+        db = self._db
+        db.execute("BEGIN IMMEDIATE")
+        try:
+            db.execute("CREATE TABLE IF NOT EXISTS points "
+                       "(row INTEGER PRIMARY KEY, id TEXT NOT NULL, domain, company_id, doc_type, url, payload TEXT)")
+            db.execute("CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT)")
+            existing = {r[1] for r in db.execute("PRAGMA table_info(points)")}
+            missing = [column for _, column in INDEXED_FIELDS if column not in existing]
+            if missing:
+                # Index files from before the filter columns: move those fields out of the blob
+                for column in missing:
+                    db.execute(f"ALTER TABLE points ADD COLUMN {column}")
+                updates = []
+                for row, blob in db.execute("SELECT row, payload FROM points").fetchall():
+                    columns, rest = _split_payload(json.loads(blob) if blob else {})
+                    updates.append((*columns, rest, row))
+                assignments = ", ".join(f"{column} = ?" for _, column in INDEXED_FIELDS)
+                db.executemany(f"UPDATE points SET {assignments}, payload = ? WHERE row = ?", updates)
+            for _, column in INDEXED_FIELDS:
+                db.execute(f"CREATE INDEX IF NOT EXISTS idx_points_{column} ON points ({column})")
+            if db.execute("SELECT 1 FROM meta WHERE key = 'rows'").fetchone() is None:
+                # sqlite is the source of truth for the row count: vectors past it (from an
+                # interrupted write) are ignored and overwritten by the next add()
+                rows = db.execute("SELECT COALESCE(MAX(row) + 1, 0) FROM points").fetchone()[0]
+                db.execute("INSERT INTO meta (key, value) VALUES ('rows', ?)", (str(rows),))
+            db.execute("COMMIT")
+        except Exception:
+            db.execute("ROLLBACK")
+            raise
+
+    def _sync(self):
+        """Pick up rows and deletions committed by other instances on the same path. Call under self._lock."""
+        meta = dict(self._db.execute("SELECT key, value FROM meta WHERE key IN ('dim', 'rows', 'version')"))
+        if self.dim is None and "dim" in meta:
+            self.dim = int(meta["dim"])
+        rows = int(meta.get("rows", 0))
+        version = int(meta.get("version", 0))
+
+        if version != self._version:
+            # Deleted elsewhere: rebuild the mask from sqlite, and the ANN index on next use
+            self.count, self._version, self._matrix, self._ann = rows, version, None, None
+            self._alive = np.zeros(rows, dtype=bool)
+            self._alive[[r[0] for r in self._db.execute("SELECT row FROM points")]] = True
+            self._alive_count = int(self._alive.sum())
+        elif rows != self.count:
+            if self._alive is not None:
+                self._alive = np.concatenate([self._alive, np.ones(rows - self.count, dtype=bool)])
+            self._alive_count += rows - self.count
+            self.count, self._matrix = rows, None
+
+    # --- writes ---
+
+    def add(self, ids: list, vectors, payloads: list):
+        vectors = np.asarray(vectors, dtype=np.float32)
+        if vectors.ndim != 2 or not len(vectors):
+            return
+        vectors = _normalize(vectors)
+
+        with self._lock:
+            # Take the sqlite write lock first so concurrent writers get distinct rows
+            self._db.execute("BEGIN IMMEDIATE")
+            try:
+                self._sync()
+                if self.dim is None:
+                    self.dim = vectors.shape[1]
+                    self._db.execute("INSERT OR REPLACE INTO meta (key, value) VALUES ('dim', ?)", (str(self.dim),))
+                elif vectors.shape[1] != self.dim:
+                    raise ValueError(f"Vector dimension {vectors.shape[1]} does not match index dimension {self.dim}")
+
+                start = self.count
+                if self._vectors_path:
+                    mode = "r+b" if os.path.exists(self._vectors_path) else "wb"
+                    with open(self._vectors_path, mode) as f:
+                        f.seek(start * self.dim * 4)
+                        f.write(vectors.tobytes())
+                        f.truncate()
+
+                rows = []
+                for i, (point_id, payload) in enumerate(zip(ids, payloads)):
+                    columns, rest = _split_payload(payload)
+                    rows.append((start + i, str(point_id), *columns, rest))
+                self._db.executemany(f"INSERT INTO points ({POINT_COLUMNS}) VALUES ({', '.join('?' * (len(INDEXED_FIELDS) + 3))})", rows)
+                self._db.execute("UPDATE meta SET value = ? WHERE key = 'rows'", (str(start + len(vectors)),))
+                self._db.execute("COMMIT")
+            except Exception:
+                self._db.execute("ROLLBACK")
+                raise
+
+            if not self._vectors_path:
+                self._blocks.append(vectors)
+            self._sync()
+
+    def delete(self, filter_dict: dict) -> int:
+        """Delete every point matching filter_dict (same semantics as search filters). Returns points deleted."""
+        if not filter_dict:
+            raise ValueError("delete() needs a filter")
+        with self._lock:
+            self._db.execute("BEGIN IMMEDIATE")
+            try:
+                self._sync()
+                rows = self._filter_rows(filter_dict)
+                if len(rows):
+                    self._db.executemany("DELETE FROM points WHERE row = ?", [(int(r),) for r in rows])
+                    self._db.execute("INSERT OR REPLACE INTO meta (key, value) VALUES ('version', ?)", (str(self._version + 1),))
+                self._db.execute("COMMIT")
+            except Exception:
+                self._db.execute("ROLLBACK")
+                raise
+
+            if len(rows):
+                # Apply our own delete in place rather than rebuilding the mask and ANN index
+                if self._alive is None:
+                    self._alive = np.ones(self.count, dtype=bool)
+                self._alive[rows] = False
+                self._alive_count = int(self._alive.sum())
+                if self._ann is not None:
+                    for row in rows[rows < self._ann_count]:
+                        self._ann.mark_deleted(int(row))
+                self._version += 1
+            return len(rows)
+
+    # --- reads ---
+
+    def _load_matrix(self) -> np.ndarray:
+        if self._matrix is None:
+            if not self.count:
+                self._matrix = np.zeros((0, self.dim or 0), dtype=np.float32)
+            elif self._vectors_path:
+                self._matrix = np.memmap(self._vectors_path, dtype=np.float32, mode="r", shape=(self.count, self.dim))
+            else:
+                if len(self._blocks) > 1:
+                    self._blocks = [np.concatenate(self._blocks)]
+                self._matrix = self._blocks[0]
+        return self._matrix
+
+    def _filter_rows(self, filter_dict: dict) -> np.ndarray:
+        """Row numbers whose payload equals every key/value in filter_dict (Qdrant `must` + MatchValue)."""
+        clauses, params = [], []
+        for key, value in filter_dict.items():
+            column = INDEXED_COLUMNS.get(key)
+            if column and _is_column_value(value):
+                clauses.append(f"{column} = ?")
+                params.append(value)
+            else:
+                clauses.append("json_extract(payload, ?) = ?")
+                params.extend(['$."{}"'.format(key), value])
+        cursor = self._db.execute(f"SELECT row FROM points WHERE {' AND '.join(clauses)} ORDER BY row", params)
+        return np.fromiter((r[0] for r in cursor), dtype=np.int64)
+
+    def _exact_search(self, matrix, query, limit, candidates=None):
+        subset = matrix if candidates is None else matrix[candidates]
+        scores = subset @ query
+        if candidates is None and self._alive is not None:
+            scores = np.where(self._alive, scores, -np.inf)
+        k = min(limit, len(scores) if candidates is not None else self._alive_count)
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top])]
+        rows = top if candidates is None else candidates[top]
+        return rows, scores[top]
+
+    def _ann_index(self, matrix):
+        if self._ann is None:
+            index = hnswlib.Index(space="ip", dim=self.dim)
+            index.init_index(max_elements=max(2 * self.count, 1024), ef_construction=200, M=16)
+            self._ann, self._ann_count = index, 0
+        if self._ann_count < self.count:
+            if self.count > self._ann.get_max_elements():
+                self._ann.resize_index(2 * self.count)
+            labels = np.arange(self._ann_count, self.count)
+            if self._alive is not None:
+                labels = labels[self._alive[self._ann_count:self.count]]
+            if len(labels):
+                self._ann.add_items(np.asarray(matrix[labels]), labels)
+            self._ann_count = self.count
+        return self._ann
+
+    def _ann_search(self, matrix, query, limit, candidates=None):
+        k = min(self._alive_count, limit if candidates is None else limit * ANN_FILTER_OVERSAMPLE)
+        index = self._ann_index(matrix)
+        index.set_ef(max(2 * k, 64))
+        labels, distances = index.knn_query(query, k=k)
+        rows, scores = labels[0].astype(np.int64), 1.0 - distances[0]
+        if candidates is not None:
+            keep = np.isin(rows, candidates)
+            rows, scores = rows[keep], scores[keep]
+            if len(rows) < min(limit, len(candidates)):
+                # The filter is too selective for the oversampled ANN result; fall back to exact
+                return self._exact_search(matrix, query, limit, candidates)
+        return rows[:limit], scores[:limit]
+
+    def search(self, vector, limit: int = 5, filter_dict: dict = None) -> list:
+        """[(id, score, payload)] for the `limit` most similar points, best first."""
+        query = _normalize(np.asarray(vector, dtype=np.float32).reshape(1, -1))[0]
+        with self._lock:
+            self._sync()
+            if not self._alive_count or limit <= 0:
+                return []
+            matrix = self._load_matrix()
+            candidates = self._filter_rows(filter_dict) if filter_dict else None
+            if candidates is not None and not len(candidates):
+                return []
+
+            searched = self._alive_count if candidates is None else len(candidates)
+            if searched > self.exact_threshold and hnswlib is not None:
+                rows, scores = self._ann_search(matrix, query, limit, candidates)
+            else:
+                rows, scores = self._exact_search(matrix, query, limit, candidates)
+
+            placeholders = ",".join("?" * len(rows))
+            stored = {
+                r[0]: (r[1], _join_payload(r[2:-1], r[-1]))
+                for r in self._db.execute(
+                    f"SELECT {POINT_COLUMNS} FROM points WHERE row IN ({placeholders})", [int(r) for r in rows])
+            }
+        return [
+            (stored[int(row)][0], float(score), stored[int(row)][1])
+            for row, score in zip(rows, scores) if int(row) in stored
+        ]
+
+    def close(self):
+        with self._lock:
+            self._db.close()
+
+
+_indexes = {}
+_indexes_lock = threading.Lock()
+
+def get_local_index(path: str = None) -> LocalVectorIndex:
+    """Process-wide LocalVectorIndex for `path` (None = one shared in-memory index)."""
+    key = os.path.abspath(path) if path else None
+    with _indexes_lock:
+        index = _indexes.get(key)
+        if index is None:
+            index = _indexes[key] = LocalVectorIndex(path)
+        return index
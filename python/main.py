@@ -1,5 +1,7 @@
 from fastapi import FastAPI, HTTPException, BackgroundTasks
+from fastapi.responses import PlainTextResponse, StreamingResponse
 from pydantic import BaseModel
+from typing import Optional
 import psycopg2
 from psycopg2.extras import RealDictCursor
 import os
@@ -8,6 +10,12 @@ from discovery import Discovery
 from scraper import Scraper
 from vector_store import VectorStore
 from extractor import Extractor
+import metrics
+import concurrency
+from jobs import JobManager
+from processing_log import write_log_rows, maintain_partitions
+from claims import release_stale_claims
+from batch_processor import POLICY_PAGE_UPSERT
 
 
 app = FastAPI()
@@ -30,24 +38,22 @@ extractor = Extractor() # This might be heavy to init
 def process_domain_task(request: ProcessingRequest):
     conn = get_db_connection()
     cursor = conn.cursor()
+    # Log rows are buffered and written in one INSERT with the final commit
+    log_rows = []
     
     try:
         print(f"Processing {request.domain}")
         # Log start
-        cursor.execute("INSERT INTO processing_log (company_id, step, status, message) VALUES (%s, %s, %s, %s)", 
-                       (request.id, 'start', 'running', 'Started processing'))
-        conn.commit()
+        log_rows.append((request.id, 'start', 'running', 'Started processing', None))
 
         # 1. Discovery
         links = discovery.find_policy_links(request.domain)
-        cursor.execute("INSERT INTO processing_log (company_id, step, status, message) VALUES (%s, %s, %s, %s)",
-                       (request.id, 'discovery', 'completed', f"Found: {links}"))
+        log_rows.append((request.id, 'discovery', 'completed', f"Found: {links}", None))
         
         # Save links
         for p_type, url in links.items():
             if url:
-                cursor.execute("INSERT INTO policy_pages (company_id, page_type, url) VALUES (%s, %s, %s) ON CONFLICT DO NOTHING",
-                               (request.id, p_type, url))
+                cursor.execute(POLICY_PAGE_UPSERT, (request.id, p_type, url))
         conn.commit()
 
         # 2. Scrape & Vectorize
@@ -56,16 +62,17 @@ def process_domain_task(request: ProcessingRequest):
             if url:
                 text = scraper.fetch_page(url)
                 clean_text = scraper.clean_text(text)
-                chunks = scraper.chunk_text(clean_text)
+                # Store vectors, embedding chunks in batches as they are produced. The page's
+                # points from earlier runs are replaced, not duplicated
+                if clean_text:
+                    vector_store.delete({"url": url})
+                chunks = vector_store.add_chunks(scraper.iter_chunks(clean_text),
+                                                 {"domain": request.domain, "type": p_type, "url": url})
                 all_text_chunks.extend(chunks)
-                
-                # Store vectors
-                metadatas = [{"domain": request.domain, "type": p_type, "url": url, "text": chunk} for chunk in chunks]
-                vector_store.add_texts(chunks, metadatas)
         
         if not all_text_chunks:
-             cursor.execute("INSERT INTO processing_log (company_id, step, status, message) VALUES (%s, %s, %s, %s)",
-                       (request.id, 'scraping', 'failed', 'No content found'))
+             log_rows.append((request.id, 'scraping', 'failed', 'No content found', None))
+             write_log_rows(cursor, log_rows)
              conn.commit()
              return
 
@@ -99,14 +106,15 @@ def process_domain_task(request: ProcessingRequest):
                    enrichment.get('privacy_email'), enrichment.get('delete_link'), 
                    enrichment.get('country'), request.id))
 
-        cursor.execute("INSERT INTO processing_log (company_id, step, status, message) VALUES (%s, %s, %s, %s)",
-                       (request.id, 'complete', 'completed', 'Finished processing'))
+        log_rows.append((request.id, 'complete', 'completed', 'Finished processing', None))
+        write_log_rows(cursor, log_rows)
         conn.commit()
 
     except Exception as e:
         print(f"Error: {e}")
-        cursor.execute("INSERT INTO processing_log (company_id, step, status, message) VALUES (%s, %s, %s, %s)",
-                       (request.id, 'error', 'failed', str(e)))
+        conn.rollback()
+        log_rows.append((request.id, 'error', 'failed', str(e), None))
+        write_log_rows(cursor, log_rows)
         conn.commit()
     finally:
         cursor.close()
@@ -163,6 +171,48 @@ class ImportRequest(BaseModel):
 
 class PendingProcessRequest(BaseModel):
     limit: int = 5
+    # Run as a background job and return a job id instead of blocking
+    background: bool = False
+
+class BatchProcessRequest(ImportRequest):
+    limit: int = 5
+    background: bool = False
+
+class JobRequest(BaseModel):
+    limit: int = 10
+    csv_path: Optional[str] = None
+
+def _create_batch_processor():
+    from batch_processor import BatchProcessor
+    return BatchProcessor()
+
+job_manager = JobManager(_create_batch_processor)
+
+@app.on_event("startup")
+def fail_interrupted_jobs():
+    # Jobs from a previous process can never finish; without this their streams would poll forever
+    try:
+        job_manager.fail_interrupted_jobs()
+    except Exception as e:
+        print(f"Warning: could not check for interrupted jobs: {e}")
+    # Companies left 'processing' by a dead worker would otherwise never be picked up again
+    try:
+        conn = get_db_connection()
+        try:
+            release_stale_claims(conn)
+        finally:
+            conn.close()
+    except Exception as e:
+        print(f"Warning: could not release stale company claims: {e}")
+    # Partitions for the coming months must exist before any processing_log insert lands there
+    try:
+        conn = get_db_connection()
+        try:
+            maintain_partitions(conn)
+        finally:
+            conn.close()
+    except Exception as e:
+        print(f"Warning: could not maintain processing_log partitions: {e}")
 
 @app.post("/api/import-csv")
 def import_csv(req: ImportRequest):
@@ -172,16 +222,21 @@ def import_csv(req: ImportRequest):
 
 @app.post("/api/process-pending")
 def process_pending(req: PendingProcessRequest):
+    if req.background:
+        return job_manager.submit(req.limit)
     from batch_processor import BatchProcessor
     processor = BatchProcessor()
     return processor.process_pending_companies(req.limit)
 
 # Kept for backward compatibility if needed, but implementation redirects to new logic or similar
 @app.post("/api/batch-process")
-def batch_process_legacy(req: ImportRequest):
+def batch_process_legacy(req: BatchProcessRequest):
     # This was originally doing both. Now strict separation is requested.
     # We can make it do both sequentially for backward compat?
     # Or just deprecate. Let's make it do Import + Process(5) for simple test
+    if req.background:
+        # Import + process as one background job
+        return job_manager.submit(req.limit, req.csv_path)
     from batch_processor import BatchProcessor
     processor = BatchProcessor()
     import_res = processor.import_csv_to_db(req.csv_path)
@@ -189,13 +244,71 @@ def batch_process_legacy(req: ImportRequest):
         return import_res
     
     # Process some
-    process_res = processor.process_pending_companies(limit=5)
+    process_res = processor.process_pending_companies(limit=req.limit)
     return {
         "import_summary": import_res,
         "process_summary": process_res
     }
 
 
+class RecrawlRequest(BaseModel):
+    limit: int = 100
+
+@app.post("/api/recrawl")
+def recrawl(req: RecrawlRequest, background_tasks: BackgroundTasks):
+    # Recheck due pages in the background; changed companies go back to 'pending'
+    from recrawl import RecrawlScheduler
+    background_tasks.add_task(RecrawlScheduler(scraper).run_due, req.limit)
+    return {"status": "accepted", "message": f"Rechecking up to {req.limit} due pages"}
+
+@app.post("/api/jobs")
+def submit_job(req: JobRequest):
+    # Returns immediately; poll /api/jobs/{job_id} or stream /api/jobs/{job_id}/stream
+    return job_manager.submit(req.limit, req.csv_path)
+
+@app.get("/api/jobs/{job_id}")
+def get_job(job_id: str):
+    job = job_manager.get_job(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job
+
+@app.get("/api/jobs/{job_id}/results")
+def get_job_results(job_id: str, after_id: int = 0, limit: int = 100):
+    results = job_manager.get_results(job_id, after_id=after_id, limit=min(limit, 1000))
+    next_after_id = results[-1]["id"] if results else after_id
+    return {"job_id": job_id, "results": results, "next_after_id": next_after_id}
+
+@app.get("/api/jobs/{job_id}/stream")
+def stream_job(job_id: str, format: str = "ndjson"):
+    if job_manager.get_job(job_id) is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    media_type = "text/event-stream" if format == "sse" else "application/x-ndjson"
+    return StreamingResponse(job_manager.stream(job_id, fmt=format), media_type=media_type)
+
+@app.get("/api/export")
+def export_results(format: str = "csv", since: Optional[str] = None):
+    # Streams straight from a server-side cursor; nothing is materialised in memory
+    import export
+    if format not in export.FORMATS:
+        raise HTTPException(status_code=400, detail=f"format must be one of {export.FORMATS}")
+    if since:
+        try:
+            since = export.parse_since(since)
+        except ValueError:
+            raise HTTPException(status_code=400, detail="since must be an ISO-8601 timestamp")
+    extension = "ndjson" if format == "ndjson" else format
+    return StreamingResponse(
+        export.stream_export(format, since),
+        media_type=export.MEDIA_TYPES[format],
+        headers={"Content-Disposition": f"attachment; filename=policy_results.{extension}"},
+    )
+
+@app.get("/metrics", response_class=PlainTextResponse)
+def metrics_endpoint():
+    # Prometheus text exposition format
+    return PlainTextResponse(metrics.render(), media_type="text/plain; version=0.0.4")
+
 @app.get("/health")
 def health():
-    return {"status": "ok"}
+    return {"status": "ok", "concurrency": concurrency.snapshot()}
@@ -0,0 +1,234 @@
+import os
+import socket
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
+from urllib.parse import urlsplit
+from urllib.robotparser import RobotFileParser
+
+import requests
+
+# Second-level labels under which registrations happen (example.co.uk, example.com.au)
+SECOND_LEVEL_SUFFIXES = {"co", "com", "net", "org", "gov", "ac", "edu", "ne", "or"}
+
+def host_key(url: str) -> str:
+    """
+    Politeness key for a URL: the registrable domain, so all subdomains of one
+    site (mail.google.com, accounts.google.com, ...) share one queue and delay.
+    """
+    host = (urlsplit(url).hostname or "").lower()
+    labels = host.split(".")
+    if len(labels) <= 2 or host.replace(".", "").isdigit():
+        return host
+    if labels[-2] in SECOND_LEVEL_SUFFIXES and len(labels[-1]) == 2:
+        return ".".join(labels[-3:])
+    return ".".join(labels[-2:])
+
+
+# --- DNS cache ---------------------------------------------------------------
+
+class DNSCache:
+    """
+    TTL cache in front of socket.getaddrinfo. The resolver doesn't expose record
+    TTLs, so a fixed TTL is used; failures are cached briefly so dead domains
+    (tried over https and then http) aren't looked up twice.
+    """
+
+    def __init__(self, ttl: float = 300.0, negative_ttl: float = 30.0, max_entries: int = 10000):
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        self.max_entries = max_entries
+        self._entries = {}
+        self._lock = threading.Lock()
+        self._original = None
+
+    def getaddrinfo(self, host, port, family=0, type=0, proto=0, flags=0):
+        key = (host, port, family, type, proto, flags)
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+        if entry is not None and entry[0] > now:
+            if isinstance(entry[1], Exception):
+                raise entry[1]
+            return entry[1]
+
+        try:
+            result = self._original(host, port, family, type, proto, flags)
+            expires, value = now + self.ttl, result
+        except socket.gaierror as e:
+            expires, value = now + self.negative_ttl, e
+        with self._lock:
+            if len(self._entries) >= self.max_entries:
+                self._entries.clear()
+            self._entries[key] = (expires, value)
+        if isinstance(value, Exception):
+            raise value
+        return value
+
+    def install(self):
+        if self._original is None:
+            self._original = socket.getaddrinfo
+            socket.getaddrinfo = self.getaddrinfo
+        return self
+
+
+_dns_cache = None
+_dns_lock = threading.Lock()
+
+def install_dns_cache() -> DNSCache:
+    global _dns_cache
+    with _dns_lock:
+        if _dns_cache is None:
+            _dns_cache = DNSCache(ttl=float(os.getenv("DNS_CACHE_TTL", 300))).install()
+    return _dns_cache
+
+
+# --- robots.txt --------------------------------------------------------------
+
+class RobotsCache:
+    """Fetches robots.txt once per host and exposes its Crawl-delay."""
+
+    def __init__(self, user_agent: str = "*", timeout: float = 5.0):
+        self.user_agent = user_agent
+        self.timeout = timeout
+        self._delays = {}
+        self._lock = threading.Lock()
+
+    def crawl_delay(self, url: str):
+        parts = urlsplit(url)
+        origin = f"{parts.scheme}://{parts.netloc}"
+        with self._lock:
+            if origin in self._delays:
+                return self._delays[origin]
+
+        delay = None
+        try:
+            response = requests.get(f"{origin}/robots.txt", timeout=self.timeout)
+            if response.status_code == 200:
+                parser = RobotFileParser()
+                parser.parse(response.text.splitlines())
+                delay = parser.crawl_delay(self.user_agent)
+        except Exception:
+            pass
+
+        with self._lock:
+            self._delays[origin] = float(delay) if delay else None
+        return self._delays[origin]
+
+
+# --- Scheduler ---------------------------------------------------------------
+
+class HostScheduler:
+    """
+    Host-aware fetch scheduler.
+
+    - one FIFO queue per host (registrable domain)
+    - a host is dispatched at most `per_host_concurrency` at a time and no sooner than
+      `min_delay` (or its robots.txt Crawl-delay, whichever is larger) after its last request
+    - ready hosts are served round-robin, so one busy site can't starve the rest
+    Callers block in fetch(); a fixed pool of workers does the actual I/O.
+    One scheduler is shared per process (see get_scheduler) so every Scraper
+    instance obeys the same per-host limits; each request carries its own fetch_fn.
+    """
+
+    def __init__(self, workers: int = None, min_delay: float = None,
+                 per_host_concurrency: int = None, max_crawl_delay: float = 30.0, robots: RobotsCache = None):
+        self.min_delay = min_delay if min_delay is not None else float(os.getenv("HOST_MIN_DELAY", 1.0))
+        self.per_host_concurrency = per_host_concurrency or int(os.getenv("HOST_CONCURRENCY", 1))
+        self.max_crawl_delay = max_crawl_delay
+        self.robots = robots or RobotsCache()
+
+        self._queues = {}       # host -> deque[(url, fetch_fn, future)]
+        self._ring = deque()    # hosts with queued work, in round-robin order
+        self._active = {}       # host -> requests in flight
+        self._next_allowed = {} # host -> monotonic time of next permitted dispatch
+        self._delay = {}        # host -> effective delay
+        self._cond = threading.Condition()
+        self._executor = ThreadPoolExecutor(max_workers=workers or int(os.getenv("FETCH_WORKERS", 32)))
+        self._dispatcher = threading.Thread(target=self._dispatch_loop, daemon=True)
+        self._dispatcher.start()
+
+    def submit(self, url: str, fetch_fn) -> Future:
+        future = Future()
+        host = host_key(url)
+        with self._cond:
+            queue = self._queues.get(host)
+            if queue is None:
+                queue = self._queues[host] = deque()
+            if not queue:
+                self._ring.append(host)
+            queue.append((url, fetch_fn, future))
+            self._cond.notify_all()
+        return future
+
+    def fetch(self, url: str, fetch_fn):
+        return self.submit(url, fetch_fn).result()
+
+    def _pick(self, now: float):
+        """Next ready host in round-robin order, or (None, seconds until one may be ready)."""
+        wait_for = None
+        for _ in range(len(self._ring)):
+            host = self._ring[0]
+            self._ring.rotate(-1)
+            if self._active.get(host, 0) >= self.per_host_concurrency:
+                continue
+            ready_at = self._next_allowed.get(host, 0.0)
+            if ready_at <= now:
+                return host, None
+            wait_for = ready_at - now if wait_for is None else min(wait_for, ready_at - now)
+        return None, wait_for
+
+    def _dispatch_loop(self):
+        while True:
+            with self._cond:
+                host, wait_for = self._pick(time.monotonic())
+                if host is None:
+                    self._cond.wait(timeout=wait_for)
+                    continue
+
+                queue = self._queues[host]
+                url, fetch_fn, future = queue.popleft()
+                if not queue:
+                    self._ring.remove(host)
+                    del self._queues[host]
+                self._active[host] = self._active.get(host, 0) + 1
+                self._next_allowed[host] = time.monotonic() + self._delay.get(host, self.min_delay)
+
+            self._executor.submit(self._run, host, url, fetch_fn, future)
+
+    def _run(self, host, url, fetch_fn, future):
+        try:
+            if future.set_running_or_notify_cancel():
+                if host not in self._delay:
+                    crawl_delay = self.robots.crawl_delay(url)
+                    delay = max(self.min_delay, min(crawl_delay or 0.0, self.max_crawl_delay))
+                    with self._cond:
+                        self._delay[host] = delay
+                        self._next_allowed[host] = max(self._next_allowed.get(host, 0.0), time.monotonic() + delay)
+                try:
+                    future.set_result(fetch_fn(url))
+                except Exception as e:
+                    future.set_exception(e)
+        finally:
+            with self._cond:
+                self._active[host] -= 1
+                if not self._active[host]:
+                    del self._active[host]
+                if len(self._next_allowed) > 50000:
+                    # Forget hosts whose delay has long expired
+                    now = time.monotonic()
+                    self._next_allowed = {h: t for h, t in self._next_allowed.items() if t > now}
+                self._cond.notify_all()
+
+
+_scheduler = None
+_scheduler_lock = threading.Lock()
+
+def get_scheduler() -> HostScheduler:
+    global _scheduler
+    with _scheduler_lock:
+        if _scheduler is None:
+            install_dns_cache()
+            _scheduler = HostScheduler()
+    return _scheduler
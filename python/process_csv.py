@@ -1,166 +1,212 @@
+import argparse
 import csv
 import os
-import time
+import threading
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
 import psycopg2
-from psycopg2.extras import RealDictCursor
-from pydantic import BaseModel
 
 # Imports adapted for running as a script in the same directory
 try:
-    from models import ProcessingRequest
-    from discovery import Discovery
-    from scraper import Scraper
-    from vector_store import VectorStore
-    from extractor import Extractor
+    from batch_processor import BatchProcessor
+    from dedup import PolicyDocumentIndex
+    from claims import claim_company, release_stale_claims
+    from processing_log import maintain_partitions
 except ImportError:
     # Fallback if running from parent directory or different context
-    from .models import ProcessingRequest
-    from .discovery import Discovery
-    from .scraper import Scraper
-    from .vector_store import VectorStore
-    from .extractor import Extractor
+    from .batch_processor import BatchProcessor
+    from .dedup import PolicyDocumentIndex
+    from .claims import claim_company, release_stale_claims
+    from .processing_log import maintain_partitions
 
 # Configuration
 CSV_FILE = "List1.csv"
-BATCH_SIZE = 5
+JOURNAL_FILE = "process_csv.journal"
+WORKERS = int(os.getenv("PROCESS_CSV_WORKERS", 4))
+# Rows looked up against the companies table at a time
+LOOKUP_BATCH = 500
 
 def get_db_connection():
     return psycopg2.connect(os.getenv("DATABASE_URL"))
 
-print("Initializing components...")
-discovery = Discovery()
-scraper = Scraper()
-vector_store = VectorStore()
-# Extractor might be heavy (LLM init), so we init it once
-extractor = Extractor()
-print("Components initialized.")
+# Per-host politeness comes from the shared HostScheduler every fetch goes through
+# (keyed on the fetched URL's registrable domain; HOST_MIN_DELAY, robots.txt Crawl-delay).
+# Model/embedding init is heavy, so each worker thread builds one BatchProcessor and reuses it.
+_local = threading.local()
+_init_lock = threading.Lock()
 
-def process_row(row_data):
+def get_processor() -> BatchProcessor:
+    processor = getattr(_local, "processor", None)
+    if processor is None:
+        with _init_lock:
+            print("Initializing components...")
+            processor = _local.processor = BatchProcessor()
+            print("Components initialized.")
+    return processor
+
+
+class ProgressJournal:
+    """
+    Append-only local checkpoint file: one "<company id>\t<status>" line per finished row.
+    On restart, rows already in the journal are skipped, so a crash resumes where it stopped.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self.done = {}
+        if os.path.exists(path):
+            with open(path, 'r', encoding='utf-8') as f:
+                for line in f:
+                    parts = line.rstrip('\n').split('\t')
+                    if len(parts) == 2:
+                        self.done[parts[0]] = parts[1]
+        self._file = open(path, 'a', encoding='utf-8')
+        self._lock = threading.Lock()
+
+    def should_skip(self, company_id: str, retry_failed: bool) -> bool:
+        status = self.done.get(company_id)
+        if status is None:
+            return False
+        return not (retry_failed and status == 'failed')
+
+    def record(self, company_id: str, status: str):
+        with self._lock:
+            self.done[company_id] = status
+            self._file.write(f"{company_id}\t{status}\n")
+            self._file.flush()
+
+    def close(self):
+        self._file.close()
+
+
+def completed_ids(company_ids: list) -> set:
+    """Ids among `company_ids` already marked completed in the companies table."""
+    if not company_ids:
+        return set()
+    conn = get_db_connection()
+    cursor = conn.cursor()
+    try:
+        cursor.execute("SELECT id FROM companies WHERE id = ANY(%s) AND status = 'completed'", (company_ids,))
+        return {row[0] for row in cursor.fetchall()}
+    finally:
+        cursor.close()
+        conn.close()
+
+def process_row(row_data, doc_index=None):
     """
-    Replicates the logic from main.py's process_domain_task
+    Process one CSV row through the batch pipeline (BatchProcessor.process_company).
+    Returns the final status ('completed', 'failed', 'skipped'), or 'busy' if another
+    worker holds the company (not journaled, so a later run retries it).
     """
-    # Create request object similar to API
-    # CSV headers: id,name,generic_email, etc...
-    # We mainly need id, name, domain
-    
+    # CSV headers: id,name,generic_email, etc... We mainly need id, name, domain
     company_id = row_data.get('id')
     name = row_data.get('name')
     domain = row_data.get('domain')
-    
+
     if not domain:
         print(f"Skipping row {row_data}: No domain provided")
-        return
+        return 'skipped'
 
-    request = ProcessingRequest(id=company_id, name=name, domain=domain)
-    
     conn = get_db_connection()
+    # Keep processing_log partitions ahead during long runs (no-op most calls)
+    maintain_partitions(conn)
     cursor = conn.cursor()
-    
     try:
-        print(f"Processing {request.domain}...")
-        
-        # Ensure company exists
+        # Ensure company exists, then claim it so API workers don't process it at the same time
         cursor.execute("INSERT INTO companies (id, name, domain) VALUES (%s, %s, %s) ON CONFLICT (id) DO NOTHING",
-                     (request.id, request.name, request.domain))
-        conn.commit()
-
-        # Log start
-        cursor.execute("INSERT INTO processing_log (company_id, step, status, message) VALUES (%s, %s, %s, %s)", 
-                       (request.id, 'start', 'running', 'Started processing from script'))
-        conn.commit()
-
-        # 1. Discovery
-        links = discovery.find_policy_links(request.domain)
-        cursor.execute("INSERT INTO processing_log (company_id, step, status, message) VALUES (%s, %s, %s, %s)",
-                       (request.id, 'discovery', 'completed', f"Found: {links}"))
-        
-        for p_type, url in links.items():
-            if url:
-                cursor.execute("INSERT INTO policy_pages (company_id, page_type, url) VALUES (%s, %s, %s) ON CONFLICT DO NOTHING",
-                               (request.id, p_type, url))
-        conn.commit()
-
-        # 2. Scrape & Vectorize
-        all_text_chunks = []
-        for p_type, url in links.items():
-            if url:
-                try:
-                    text = scraper.fetch_page(url)
-                    clean_text = scraper.clean_text(text)
-                    chunks = scraper.chunk_text(clean_text)
-                    all_text_chunks.extend(chunks)
-                    
-                    metadatas = [{"domain": request.domain, "type": p_type, "url": url, "text": chunk} for chunk in chunks]
-                    vector_store.add_texts(chunks, metadatas)
-                except Exception as e:
-                    print(f"  Error scraping {url}: {e}")
-
-        if not all_text_chunks:
-             cursor.execute("INSERT INTO processing_log (company_id, step, status, message) VALUES (%s, %s, %s, %s)",
-                       (request.id, 'scraping', 'failed', 'No content found'))
-             conn.commit()
-             return
-
-        # 3. Extract Scopes
-        scopes = extractor.extract_scopes(all_text_chunks)
-        cursor.execute("""
-            INSERT INTO policy_scopes (company_id, scope_registration, scope_legal, scope_customization, scope_marketing, scope_security)
-            VALUES (%s, %s, %s, %s, %s, %s)
-            ON CONFLICT (company_id) DO UPDATE SET
-            scope_registration = EXCLUDED.scope_registration,
-            scope_legal = EXCLUDED.scope_legal,
-            scope_customization = EXCLUDED.scope_customization,
-            scope_marketing = EXCLUDED.scope_marketing,
-            scope_security = EXCLUDED.scope_security
-        """, (request.id, scopes.get('scope_registration'), scopes.get('scope_legal'), 
-              scopes.get('scope_customization'), scopes.get('scope_marketing'), scopes.get('scope_security')))
-        
-        # 4. Enrich Data
-        enrichment = extractor.enrich_company_data(all_text_chunks, None)
-        if enrichment:
-             cursor.execute("""
-                UPDATE companies SET
-                generic_email = COALESCE(%s, generic_email),
-                contact_email = COALESCE(%s, contact_email),
-                privacy_email = COALESCE(%s, privacy_email),
-                delete_link = COALESCE(%s, delete_link),
-                country = COALESCE(%s, country)
-                WHERE id = %s
-             """, (enrichment.get('generic_email'), enrichment.get('contact_email'), 
-                   enrichment.get('privacy_email'), enrichment.get('delete_link'), 
-                   enrichment.get('country'), request.id))
-
-        cursor.execute("INSERT INTO processing_log (company_id, step, status, message) VALUES (%s, %s, %s, %s)",
-                       (request.id, 'complete', 'completed', 'Finished processing'))
-        conn.commit()
-        print(f"Finished {request.domain}")
-
-    except Exception as e:
-        print(f"Error processing {request.domain}: {e}")
-        cursor.execute("INSERT INTO processing_log (company_id, step, status, message) VALUES (%s, %s, %s, %s)",
-                       (request.id, 'error', 'failed', str(e)))
-        conn.commit()
+                       (company_id, name, domain))
+        if not claim_company(conn, cursor, company_id):
+            print(f"Skipping {domain}: being processed by another worker")
+            return 'busy'
+
+        print(f"Processing {domain}...")
+        result = get_processor().process_company(conn, company_id, name, domain, doc_index)
+        print(f"Finished {domain}: {result['status']}")
+        return result['status']
     finally:
         cursor.close()
         conn.close()
 
+def iter_rows(csv_file):
+    # Stream rows instead of loading the whole file
+    with open(csv_file, 'r', encoding='utf-8-sig') as f:
+        for row in csv.DictReader(f):
+            yield row
+
+def iter_batches(rows, size):
+    batch = []
+    for row in rows:
+        batch.append(row)
+        if len(batch) >= size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
 def main():
-    if not os.path.exists(CSV_FILE):
-        print(f"Error: {CSV_FILE} not found in current directory.")
+    parser = argparse.ArgumentParser(description="Bulk-process a company CSV (resumable, parallel)")
+    parser.add_argument("--csv", default=CSV_FILE)
+    parser.add_argument("--workers", type=int, default=WORKERS, help="companies processed concurrently")
+    parser.add_argument("--journal", default=JOURNAL_FILE, help="checkpoint file used to resume after a crash")
+    parser.add_argument("--retry-failed", action="store_true", help="reprocess rows the journal recorded as failed")
+    args = parser.parse_args()
+
+    if not os.path.exists(args.csv):
+        print(f"Error: {args.csv} not found in current directory.")
         return
 
-    print("Reading CSV...")
-    with open(CSV_FILE, 'r', encoding='utf-8-sig') as f:
-        reader = csv.DictReader(f)
-        rows = list(reader)
-        print(f"Found {len(rows)} rows.")
-        
-        for i, row in enumerate(rows):
-            process_row(row)
-            # Basic rate limiting
-            if (i + 1) % BATCH_SIZE == 0:
-                print("Batch pause (2s)...")
-                time.sleep(2)
+    conn = get_db_connection()
+    try:
+        release_stale_claims(conn)
+    finally:
+        conn.close()
+
+    journal = ProgressJournal(args.journal)
+    # One dedup index for the run, so shared policies are fetched and extracted once
+    doc_index = PolicyDocumentIndex()
+    counts = {"completed": 0, "failed": 0, "skipped": 0, "busy": 0, "already_done": 0}
+    counts_lock = threading.Lock()
+    print(f"Reading CSV... ({len(journal.done)} rows already in journal {args.journal})")
+
+    def run(row):
+        try:
+            status = process_row(row, doc_index)
+        except Exception as e:
+            print(f"Error processing {row.get('domain')}: {e}")
+            status = 'failed'
+        if row.get('id') and status != 'busy':
+            journal.record(row['id'], status)
+        with counts_lock:
+            counts[status] += 1
+
+    executor = ThreadPoolExecutor(max_workers=args.workers)
+    in_flight = set()
+    try:
+        for batch in iter_batches(iter_rows(args.csv), LOOKUP_BATCH):
+            todo = [r for r in batch if not (r.get('id') and journal.should_skip(r['id'], args.retry_failed))]
+            done_in_db = completed_ids([r['id'] for r in todo if r.get('id')])
+            with counts_lock:
+                counts["already_done"] += len(batch) - len(todo)
+
+            for row in todo:
+                if row.get('id') in done_in_db:
+                    journal.record(row['id'], 'completed')
+                    with counts_lock:
+                        counts["already_done"] += 1
+                    continue
+                # Bounded queue: don't read further ahead than the workers can take
+                while len(in_flight) >= args.workers * 2:
+                    finished, in_flight = wait(in_flight, return_when=FIRST_COMPLETED)
+                    for future in finished:
+                        future.result()
+                in_flight.add(executor.submit(run, row))
+
+        for future in in_flight:
+            future.result()
+    finally:
+        executor.shutdown(wait=True)
+        journal.close()
+
+    print(f"Done: {counts}")
 
 if __name__ == "__main__":
     main()
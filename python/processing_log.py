@@ -0,0 +1,71 @@
+"""
+Helpers for the processing_log table.
+
+The table is range-partitioned by month (see sql/init.sql). New partitions are
+created ahead of time and expired ones dropped by maintain_partitions(), which
+is cheap to call often: it only touches the database once per interval per process.
+"""
+import os
+import threading
+import time
+
+from psycopg2.extras import execute_values
+
+LOG_INSERT = "INSERT INTO processing_log (company_id, step, status, message, duration_seconds) VALUES %s"
+
+PARTITIONS_AHEAD = int(os.getenv("LOG_PARTITIONS_AHEAD", 2))
+RETENTION_MONTHS = int(os.getenv("LOG_RETENTION_MONTHS", 6))
+MAINTENANCE_INTERVAL = float(os.getenv("LOG_MAINTENANCE_INTERVAL_SECONDS", 3600))
+# After a failed attempt, wait this long (not the full interval) before trying again
+MAINTENANCE_RETRY = float(os.getenv("LOG_MAINTENANCE_RETRY_SECONDS", 300))
+
+_next_maintenance = 0.0
+_maintenance_running = False
+_maintenance_lock = threading.Lock()
+
+
+def write_log_rows(cursor, rows):
+    """
+    Insert (company_id, step, status, message, duration_seconds) tuples in one statement.
+    executemany() would still make one round trip per row.
+    """
+    if rows:
+        execute_values(cursor, LOG_INSERT, rows, page_size=500)
+
+
+def maintain_partitions(conn, force: bool = False) -> int:
+    """
+    Create upcoming monthly partitions and drop those past retention. Returns partitions dropped.
+    The next run is only scheduled a full interval out once this one has committed.
+    """
+    global _next_maintenance, _maintenance_running
+    with _maintenance_lock:
+        if _maintenance_running or (not force and time.monotonic() < _next_maintenance):
+            return 0
+        _maintenance_running = True
+
+    next_run = time.monotonic() + MAINTENANCE_RETRY
+    cursor = None
+    try:
+        cursor = conn.cursor()
+        cursor.execute("SELECT ensure_processing_log_partitions(%s)", (PARTITIONS_AHEAD,))
+        dropped = 0
+        if RETENTION_MONTHS > 0:
+            cursor.execute("SELECT drop_old_processing_log_partitions(%s)", (RETENTION_MONTHS,))
+            dropped = cursor.fetchone()[0] or 0
+        conn.commit()
+        next_run = time.monotonic() + MAINTENANCE_INTERVAL
+        if dropped:
+            print(f"INFO: dropped {dropped} expired processing_log partition(s)")
+        return dropped
+    except Exception as e:
+        # Older schemas without the partition functions: logging still works, just unmanaged
+        conn.rollback()
+        print(f"Warning: processing_log partition maintenance failed: {e}")
+        return 0
+    finally:
+        if cursor is not None:
+            cursor.close()
+        with _maintenance_lock:
+            _next_maintenance = next_run
+            _maintenance_running = False
@@ -0,0 +1,195 @@
+"""
+Incremental recrawl scheduler.
+
+Each policy page keeps a change history (policy_page_checks) and an estimated
+change rate. Pages are rechecked only when their next_check_at is due, using
+conditional GETs (ETag / Last-Modified) where the server supports them. When a
+page's content hash changes, its company is re-queued as 'pending' so the
+normal BatchProcessor run picks it up; unchanged pages just get a later check time.
+
+Usage:
+    python recrawl.py            # check everything currently due, then exit
+    python recrawl.py --loop     # keep running, sleeping until the next page is due
+"""
+import argparse
+import math
+import os
+import sys
+import time
+
+import psycopg2
+from psycopg2.extras import RealDictCursor
+
+current_dir = os.path.dirname(os.path.abspath(__file__))
+if current_dir not in sys.path:
+    sys.path.append(current_dir)
+
+try:
+    from .scraper import Scraper
+    from .dedup import content_hash
+    from .processing_log import maintain_partitions
+except ImportError:
+    from scraper import Scraper
+    from dedup import content_hash
+    from processing_log import maintain_partitions
+
+MIN_INTERVAL = int(os.getenv("RECRAWL_MIN_INTERVAL_SECONDS", 24 * 3600))
+MAX_INTERVAL = int(os.getenv("RECRAWL_MAX_INTERVAL_SECONDS", 90 * 24 * 3600))
+DEFAULT_INTERVAL = int(os.getenv("RECRAWL_DEFAULT_INTERVAL_SECONDS", 7 * 24 * 3600))
+# Delay before retrying a page whose recheck fetch failed
+FAILED_FETCH_RETRY = int(os.getenv("RECRAWL_RETRY_SECONDS", MIN_INTERVAL))
+
+
+def estimate_interval(check_count: int, change_count: int, avg_gap_seconds: float) -> int:
+    """
+    Next check interval from the page's history.
+
+    Uses the change-rate estimator for periodic polling, which corrects for
+    changes we miss between checks:  rate = -ln((n - X + 0.5) / (n + 0.5)) / I
+    (n checks, X of which saw a change, I = average gap between checks).
+    Pages are then rechecked roughly once per expected change.
+    """
+    if check_count <= 0 or not avg_gap_seconds:
+        return DEFAULT_INTERVAL
+    n, x = check_count, min(change_count, check_count)
+    rate = -math.log((n - x + 0.5) / (n + 0.5)) / avg_gap_seconds
+    if rate <= 0:
+        return MAX_INTERVAL
+    return int(max(MIN_INTERVAL, min(MAX_INTERVAL, 1.0 / rate)))
+
+
+class RecrawlScheduler:
+    def __init__(self, scraper: Scraper = None):
+        self.scraper = scraper or Scraper()
+
+    def get_db_connection(self):
+        return psycopg2.connect(os.getenv("DATABASE_URL"))
+
+    def _due_pages(self, cursor, limit: int) -> list:
+        # The next_check_at index is the priority queue: most overdue pages come first
+        cursor.execute("""
+            SELECT id, company_id, url, content_hash, etag, last_modified, last_checked_at,
+                   check_count, change_count, check_interval_seconds,
+                   EXTRACT(EPOCH FROM NOW() - discovered_at) AS age_seconds
+            FROM policy_pages
+            WHERE next_check_at <= NOW()
+            ORDER BY next_check_at
+            LIMIT %s
+            FOR UPDATE SKIP LOCKED
+        """, (limit,))
+        return cursor.fetchall()
+
+    def check_page(self, cursor, page: dict) -> bool:
+        """Recheck one page, record the result and schedule the next check. Returns True if it changed."""
+        result = self.scraper.fetch_conditional(page['url'], page.get('etag'), page.get('last_modified'))
+
+        if result['status'] != 304 and not result['text']:
+            # Failed fetch (unreachable, error status, unsupported content): it says nothing about
+            # whether the page changed, so leave the history and estimate alone and retry later
+            cursor.execute("UPDATE policy_pages SET last_checked_at = NOW(), next_check_at = NOW() + make_interval(secs => %s) WHERE id = %s",
+                           (FAILED_FETCH_RETRY, page['id']))
+            cursor.execute("INSERT INTO policy_page_checks (page_id, http_status, content_hash, changed) VALUES (%s, %s, %s, %s)",
+                           (page['id'], result['status'], page.get('content_hash'), False))
+            return False
+
+        changed = False
+        new_hash = page.get('content_hash')
+        if result['status'] == 304:
+            pass
+        else:
+            new_hash = content_hash(self.scraper.clean_text(result['text']))
+            changed = page.get('content_hash') is not None and new_hash != page.get('content_hash')
+
+        check_count = (page.get('check_count') or 0) + 1
+        change_count = (page.get('change_count') or 0) + (1 if changed else 0)
+        avg_gap = max(float(page.get('age_seconds') or 0) / check_count, 1.0)
+        interval = estimate_interval(check_count, change_count, avg_gap)
+
+        cursor.execute("""
+            UPDATE policy_pages SET
+            content_hash = %s,
+            etag = COALESCE(%s, etag),
+            last_modified = COALESCE(%s, last_modified),
+            last_checked_at = NOW(),
+            last_changed_at = CASE WHEN %s THEN NOW() ELSE last_changed_at END,
+            check_count = %s,
+            change_count = %s,
+            check_interval_seconds = %s,
+            next_check_at = NOW() + make_interval(secs => %s)
+            WHERE id = %s
+        """, (new_hash, result.get('etag'), result.get('last_modified'), changed,
+              check_count, change_count, interval, interval, page['id']))
+        cursor.execute("INSERT INTO policy_page_checks (page_id, http_status, content_hash, changed) VALUES (%s, %s, %s, %s)",
+                       (page['id'], result['status'], new_hash, changed))
+
+        if changed:
+            # Re-queue just this company; the batch pipeline reprocesses it. A company that is
+            # being processed right now keeps its claim (it is about to fetch the new content anyway)
+            cursor.execute("UPDATE companies SET status = 'pending' WHERE id = %s AND status NOT IN ('pending', 'processing')",
+                           (page['company_id'],))
+        return changed
+
+    def run_due(self, limit: int = 100) -> dict:
+        """Check up to `limit` due pages, most overdue first."""
+        conn = self.get_db_connection()
+        # A long-running --loop process keeps processing_log partitions ahead too (no-op most calls)
+        maintain_partitions(conn)
+        cursor = conn.cursor(cursor_factory=RealDictCursor)
+        checked = changed = 0
+        requeued = set()
+        try:
+            for page in self._due_pages(cursor, limit):
+                try:
+                    if self.check_page(cursor, page):
+                        changed += 1
+                        requeued.add(page['company_id'])
+                    conn.commit()
+                    checked += 1
+                except Exception as e:
+                    conn.rollback()
+                    print(f"Error rechecking {page['url']}: {e}")
+            return {
+                "status": "completed",
+                "checked": checked,
+                "changed": changed,
+                "companies_requeued": len(requeued),
+            }
+        finally:
+            cursor.close()
+            conn.close()
+
+    def seconds_until_next_due(self) -> float:
+        conn = self.get_db_connection()
+        cursor = conn.cursor()
+        try:
+            cursor.execute("SELECT EXTRACT(EPOCH FROM MIN(next_check_at) - NOW()) FROM policy_pages")
+            row = cursor.fetchone()
+            return max(0.0, float(row[0])) if row and row[0] is not None else float(MIN_INTERVAL)
+        finally:
+            cursor.close()
+            conn.close()
+
+    def run_forever(self, batch_size: int = 100, max_sleep: float = 3600.0):
+        while True:
+            summary = self.run_due(batch_size)
+            print(f"Recrawl: {summary}")
+            if summary["checked"] >= batch_size:
+                continue
+            time.sleep(min(max_sleep, max(1.0, self.seconds_until_next_due())))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Recheck policy pages that are due and re-queue changed companies")
+    parser.add_argument("--limit", type=int, default=100, help="pages per pass")
+    parser.add_argument("--loop", action="store_true", help="keep running, sleeping until the next page is due")
+    args = parser.parse_args()
+
+    scheduler = RecrawlScheduler()
+    if args.loop:
+        scheduler.run_forever(args.limit)
+    else:
+        print(scheduler.run_due(args.limit))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,207 @@
+"""
+Optional headless-browser rendering tier for JavaScript-only pages.
+
+Only used when the static fetch yields too little text (see Scraper.needs_rendering).
+A single Chromium instance with a warm pool of reusable browser contexts runs on a
+dedicated asyncio thread; callers from any thread block on render(). Images, fonts
+and media are blocked, and every page gets a hard time budget.
+
+Requires playwright (`pip install playwright && playwright install chromium`);
+without it the tier is simply disabled.
+"""
+import asyncio
+import os
+import threading
+
+BLOCKED_RESOURCE_TYPES = {"image", "font", "media"}
+
+def playwright_available() -> bool:
+    try:
+        import playwright.async_api  # noqa: F401
+        return True
+    except ImportError:
+        return False
+
+
+class BrowserPool:
+    def __init__(self, pool_size: int = None, page_timeout: float = None, recycle_after: int = 50, user_agent: str = None):
+        self.pool_size = pool_size or int(os.getenv("RENDER_POOL_SIZE", 2))
+        self.page_timeout = page_timeout or float(os.getenv("RENDER_TIMEOUT_SECONDS", 15))
+        # Separate from page_timeout: how long a caller may wait for a free context
+        self.queue_timeout = float(os.getenv("RENDER_QUEUE_TIMEOUT_SECONDS", 60))
+        # Contexts are recreated after this many pages to cap memory growth
+        self.recycle_after = recycle_after
+        self.user_agent = user_agent
+
+        self._loop = None
+        self._thread = None
+        self._playwright = None
+        self._browser = None
+        self._contexts = None  # asyncio.Queue of (context, pages_rendered, browser generation)
+        self._generation = 0   # bumped on every browser relaunch; older contexts are discarded
+        self._relaunch_lock = None
+        self._start_lock = threading.Lock()
+        # Set when the browser can't be launched (e.g. Chromium not installed); the tier then stays off
+        self.disabled = False
+
+    # --- lifecycle (runs on the pool's own event loop) ---
+
+    def _ensure_started(self):
+        with self._start_lock:
+            if self._loop is not None or self.disabled:
+                return
+            loop = asyncio.new_event_loop()
+            thread = threading.Thread(target=loop.run_forever, name="browser-pool", daemon=True)
+            thread.start()
+            try:
+                asyncio.run_coroutine_threadsafe(self._start(), loop).result(timeout=60)
+            except Exception as e:
+                # Don't relaunch on every call: one failed start disables rendering for the process
+                print(f"Warning: headless browser failed to start, rendering disabled: {e}")
+                self.disabled = True
+                try:
+                    asyncio.run_coroutine_threadsafe(self._close(), loop).result(timeout=30)
+                except Exception:
+                    pass
+                loop.call_soon_threadsafe(loop.stop)
+                return
+            self._loop, self._thread = loop, thread
+
+    async def _start(self):
+        from playwright.async_api import async_playwright
+        self._playwright = await async_playwright().start()
+        self._browser = await self._playwright.chromium.launch(headless=True)
+        self._relaunch_lock = asyncio.Lock()
+        self._contexts = asyncio.Queue()
+        for _ in range(self.pool_size):
+            self._contexts.put_nowait((await self._new_context(), 0, self._generation))
+
+    async def _new_context(self):
+        kwargs = {"user_agent": self.user_agent} if self.user_agent else {}
+        context = await self._browser.new_context(**kwargs)
+        await context.route("**/*", self._filter_request)
+        return context
+
+    async def _ensure_browser(self):
+        # Chromium can crash or be killed (OOM); relaunch it instead of failing every render from then on
+        async with self._relaunch_lock:
+            if self._browser.is_connected():
+                return
+            print("Warning: headless browser disconnected, relaunching")
+            try:
+                await self._browser.close()
+            except Exception:
+                pass
+            self._browser = await self._playwright.chromium.launch(headless=True)
+            self._generation += 1
+
+    async def _fresh_context(self):
+        await self._ensure_browser()
+        return await self._new_context(), 0, self._generation
+
+    async def _recycle(self, context, uses, generation, page):
+        """The context to put back in the pool after a render: the same one, or a replacement if it is worn out or broken."""
+        try:
+            if page is not None:
+                await page.close()
+            if generation == self._generation and self._browser.is_connected() and uses < self.recycle_after:
+                await context.clear_cookies()
+                return context, uses, generation
+        except Exception as e:
+            print(f"Warning: browser context unusable, replacing it: {e}")
+        try:
+            await context.close()
+        except Exception:
+            pass
+        try:
+            return await self._fresh_context()
+        except Exception as e:
+            # Requeue the broken context anyway so waiting callers fail fast instead of hanging
+            print(f"Warning: could not replace browser context, rendering disabled: {e}")
+            self.disabled = True
+            return context, uses, generation
+
+    @staticmethod
+    async def _filter_request(route):
+        if route.request.resource_type in BLOCKED_RESOURCE_TYPES:
+            await route.abort()
+        else:
+            await route.continue_()
+
+    async def _close(self):
+        while self._contexts is not None and not self._contexts.empty():
+            context, _, _ = self._contexts.get_nowait()
+            try:
+                await context.close()
+            except Exception:
+                pass
+        if self._browser is not None:
+            await self._browser.close()
+        if self._playwright is not None:
+            await self._playwright.stop()
+
+    def close(self):
+        if self._loop is None:
+            return
+        try:
+            asyncio.run_coroutine_threadsafe(self._close(), self._loop).result(timeout=30)
+        finally:
+            self._loop.call_soon_threadsafe(self._loop.stop)
+            self._loop = None
+
+    # --- rendering ---
+
+    async def _load(self, page, url: str) -> str:
+        budget_ms = self.page_timeout * 1000
+        await page.goto(url, wait_until="domcontentloaded", timeout=budget_ms)
+        try:
+            # Give client-side rendering a short, bounded chance to settle
+            await page.wait_for_load_state("networkidle", timeout=min(5000, budget_ms / 2))
+        except Exception:
+            pass
+        return await page.content()
+
+    async def _render(self, url: str) -> str:
+        # Waiting on the queue is the concurrency limit: at most pool_size pages at once
+        context, uses, generation = await asyncio.wait_for(self._contexts.get(), timeout=self.queue_timeout)
+        page = None
+        try:
+            if generation != self._generation or not self._browser.is_connected():
+                # Context from a browser that has since died
+                try:
+                    await context.close()
+                except Exception:
+                    pass
+                context, uses, generation = await self._fresh_context()
+            page = await context.new_page()
+            # The page budget starts once a context is ours, not while queued for one
+            return await asyncio.wait_for(self._load(page, url), timeout=self.page_timeout)
+        finally:
+            # Always hand a context back, or the pool would shrink with every failure
+            self._contexts.put_nowait(await self._recycle(context, uses + 1, generation, page))
+
+    def render(self, url: str) -> str:
+        """Rendered HTML for `url`, or "" on any failure or when the budget is exceeded."""
+        try:
+            self._ensure_started()
+            if self.disabled:
+                return ""
+            # Both the queue wait and the page itself are bounded inside _render
+            return asyncio.run_coroutine_threadsafe(self._render(url), self._loop).result()
+        except Exception as e:
+            print(f"Error rendering {url}: {e}")
+            return ""
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+def get_browser_pool():
+    """Process-wide pool, or None when rendering is disabled or playwright isn't installed."""
+    global _pool
+    if os.getenv("RENDER_FALLBACK", "1") == "0" or not playwright_available():
+        return None
+    with _pool_lock:
+        if _pool is None:
+            _pool = BrowserPool()
+    return _pool
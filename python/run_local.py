@@ -8,9 +8,13 @@ if current_dir not in sys.path:
 
 try:
     from batch_processor import BatchProcessor
+    from dedup import PolicyDocumentIndex
+    from claims import release_stale_claims
 except ImportError:
     # Try importing assuming we are in the parent package context
     from python.batch_processor import BatchProcessor
+    from python.dedup import PolicyDocumentIndex
+    from python.claims import release_stale_claims
 
 if __name__ == "__main__":
     # Local config
@@ -26,8 +30,28 @@ if __name__ == "__main__":
     
     try:
         processor = BatchProcessor()
-        result = processor.process_batch(csv_file, batch_size=5)
+        # BatchProcessor has no process_batch; import then drain the pending queue in batches of 5
+        import_result = processor.import_csv_to_db(csv_file)
+        conn = processor.get_db_connection()
+        try:
+            release_stale_claims(conn)
+        finally:
+            conn.close()
+        # One dedup index for the whole run, as a batch job does
+        doc_index = PolicyDocumentIndex()
+        batches = []
+        while True:
+            process_result = processor.process_pending_companies(limit=5, collect_details=False, doc_index=doc_index)
+            if not process_result.get("total_processed"):
+                break
+            batches.append(process_result)
+        process_summary = {
+            "batches": len(batches),
+            "total_processed": sum(b.get("total_processed", 0) for b in batches),
+            "successful": sum(b.get("successful", 0) for b in batches),
+            "failed": sum(b.get("failed", 0) for b in batches),
+        }
         import json
-        print(json.dumps(result, indent=2))
+        print(json.dumps({"import_summary": import_result, "process_summary": process_summary}, indent=2))
     except Exception as e:
         print(f"Run failed: {e}")
@@ -1,25 +1,202 @@
 import requests
 from bs4 import BeautifulSoup
+import os
 import re
+import threading
+from collections import OrderedDict
+try:
+    from .chunker import TokenChunker
+    from .concurrency import FETCH_LIMITER
+    from .politeness import get_scheduler, host_key
+    from .renderer import get_browser_pool
+except ImportError:
+    from chunker import TokenChunker
+    from concurrency import FETCH_LIMITER
+    from politeness import get_scheduler, host_key
+    from renderer import get_browser_pool
+
+# Advertise compressed transfer. requests/urllib3 decode gzip/deflate natively
+# and brotli ("br") when the `brotli` package is installed (see requirements.txt).
+try:
+    import brotli  # noqa: F401
+    ACCEPT_ENCODING = 'gzip, deflate, br'
+except ImportError:
+    ACCEPT_ENCODING = 'gzip, deflate'
+
+# Only textual responses are worth parsing; anything else (PDFs, images, archives)
+# is rejected from the headers before the body is downloaded.
+DEFAULT_ALLOWED_CONTENT_TYPES = ('text/html', 'application/xhtml+xml', 'text/plain')
+# Responses worth re-rendering in a browser ('' = server sent no Content-Type)
+HTML_CONTENT_TYPES = ('text/html', 'application/xhtml+xml', '')
+
+# Hosts (registrable domains) that have answered a request in this process. A read
+# timeout from one of them suggests our side is saturated; a timeout from a host that
+# never answered is just a slow or dead site.
+RESPONDING_HOSTS_MAX = 10000
+_responding_hosts = OrderedDict()
+_responding_lock = threading.Lock()
+
+def _mark_responding(url: str):
+    key = host_key(url)
+    with _responding_lock:
+        _responding_hosts[key] = True
+        _responding_hosts.move_to_end(key)
+        while len(_responding_hosts) > RESPONDING_HOSTS_MAX:
+            _responding_hosts.popitem(last=False)
+
+def _was_responding(url: str) -> bool:
+    with _responding_lock:
+        return host_key(url) in _responding_hosts
 
 class Scraper:
-    def __init__(self):
+    def __init__(self, max_bytes: int = None, allowed_content_types: tuple = None, timeout: int = 10):
         self.headers = {
-            'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36'
+            'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36',
+            'Accept': 'text/html,application/xhtml+xml,text/plain;q=0.9',
+            'Accept-Encoding': ACCEPT_ENCODING,
         }
+        # Per-page byte budget (decoded bytes). Bodies larger than this are cut off early.
+        self.max_bytes = max_bytes or int(os.getenv("SCRAPER_MAX_BYTES", 2 * 1024 * 1024))
+        self.allowed_content_types = allowed_content_types or DEFAULT_ALLOWED_CONTENT_TYPES
+        self.timeout = timeout
+        self.chunk_size = 16 * 1024
+        self._chunker = None
+        # Route fetches through the shared per-host politeness scheduler (FETCH_SCHEDULER=0 to bypass)
+        self.scheduler = get_scheduler() if os.getenv("FETCH_SCHEDULER", "1") != "0" else None
+        # Optional headless-browser tier for JS-only pages (None without playwright)
+        self.renderer = get_browser_pool()
+        self.render_min_text_chars = int(os.getenv("RENDER_MIN_TEXT_CHARS", 500))
+
+    def _is_allowed_content_type(self, content_type: str) -> bool:
+        # Missing header: let it through and let the byte budget protect us
+        if not content_type:
+            return True
+        mime = content_type.split(';')[0].strip().lower()
+        return mime in self.allowed_content_types
 
     def fetch_page(self, url: str) -> str:
-        try:
-            # Ensure scheme
-            if not url.startswith('http'):
-                url = 'https://' + url
-            
-            response = requests.get(url, headers=self.headers, timeout=10)
-            response.raise_for_status()
-            return response.text
-        except Exception as e:
-            print(f"Error fetching {url}: {e}")
+        # Ensure scheme
+        if not url.startswith('http'):
+            url = 'https://' + url
+
+        if self.scheduler is not None:
+            return self.scheduler.fetch(url, self._fetch_now)
+        return self._fetch_now(url)
+
+    def needs_rendering(self, clean_text: str, fetched: dict) -> bool:
+        """
+        Escalate to the browser only when the static fetch (see fetch_document) succeeded
+        with an HTML body that produced (almost) no text. Failed fetches, error statuses
+        and non-HTML bodies would only tie up a browser context until the timeout.
+        """
+        if self.renderer is None or self.renderer.disabled or len(clean_text or "") >= self.render_min_text_chars:
+            return False
+        return (fetched.get("status") == 200 and bool(fetched.get("text"))
+                and fetched.get("content_type") in HTML_CONTENT_TYPES)
+
+    def render_page(self, url: str) -> str:
+        if self.renderer is None or self.renderer.disabled:
             return ""
+        if not url.startswith('http'):
+            url = 'https://' + url
+        # Still polite: rendering a page hits the same host
+        if self.scheduler is not None:
+            return self.scheduler.fetch(url, self.renderer.render)
+        return self.renderer.render(url)
+
+    def fetch_document(self, url: str) -> dict:
+        """Like fetch_page, but returns {"status", "text", "etag", "last_modified", "content_type"}."""
+        return self.fetch_conditional(url)
+
+    def fetch_conditional(self, url: str, etag: str = None, last_modified: str = None) -> dict:
+        """
+        Conditional GET using stored HTTP validators (used by the recrawler).
+        Returns {"status", "text", "etag", "last_modified", "content_type"}; status 304 means unchanged.
+        """
+        if not url.startswith('http'):
+            url = 'https://' + url
+        extra_headers = {}
+        if etag:
+            extra_headers['If-None-Match'] = etag
+        if last_modified:
+            extra_headers['If-Modified-Since'] = last_modified
+        meta = {"status": None, "etag": None, "last_modified": None, "content_type": None}
+
+        def fetch(u):
+            return self._fetch_now(u, extra_headers, meta)
+
+        text = self.scheduler.fetch(url, fetch) if self.scheduler is not None else fetch(url)
+        meta["text"] = text
+        return meta
+
+    def _fetch_now(self, url: str, extra_headers: dict = None, meta: dict = None) -> str:
+        # Adaptive in-flight limit shared by all fetches in this process. Only signals about
+        # our own capacity cut it: one site's 429/503 or unreachable server is a plain
+        # failure (per-host pacing is the HostScheduler's job).
+        with FETCH_LIMITER.slot() as slot:
+            try:
+                return self._download(url, extra_headers, meta)
+            except requests.ReadTimeout as e:
+                if _was_responding(url):
+                    slot.mark_overloaded()
+                else:
+                    slot.mark_failed()
+                print(f"Error fetching {url}: {e}")
+                return ""
+            except requests.HTTPError as e:
+                status = e.response.status_code if e.response is not None else None
+                if meta is not None:
+                    meta["status"] = status
+                if status in (429, 503):
+                    slot.mark_failed()
+                print(f"Error fetching {url}: {e}")
+                return ""
+            except Exception as e:
+                slot.mark_failed()
+                print(f"Error fetching {url}: {e}")
+                return ""
+
+    def _download(self, url: str, extra_headers: dict = None, meta: dict = None) -> str:
+        headers = {**self.headers, **extra_headers} if extra_headers else self.headers
+        # Stream so the body is only pulled in as far as the byte budget allows
+        with requests.get(url, headers=headers, timeout=self.timeout, stream=True) as response:
+            _mark_responding(url)
+            response.raise_for_status()
+            if meta is not None:
+                meta["status"] = response.status_code
+                meta["etag"] = response.headers.get('ETag')
+                meta["last_modified"] = response.headers.get('Last-Modified')
+            if response.status_code == 304:
+                return ""
+
+            content_type = response.headers.get('Content-Type', '')
+            if meta is not None:
+                meta["content_type"] = content_type.split(';')[0].strip().lower()
+            if not self._is_allowed_content_type(content_type):
+                print(f"Skipping {url}: unsupported content type '{content_type}'")
+                return ""
+
+            body = bytearray()
+            truncated = False
+            # iter_content transparently decodes gzip/deflate/br transfer encoding
+            for block in response.iter_content(chunk_size=self.chunk_size):
+                if not block:
+                    continue
+                remaining = self.max_bytes - len(body)
+                if len(block) >= remaining:
+                    body.extend(block[:remaining])
+                    truncated = True
+                    break
+                body.extend(block)
+
+            if truncated:
+                print(f"WARNING: {url} exceeded {self.max_bytes} bytes, truncated")
+
+            encoding = response.encoding or 'utf-8'
+            # requests falls back to ISO-8859-1 for text/* without a charset; most pages are utf-8
+            if encoding.lower() == 'iso-8859-1' and 'charset' not in content_type.lower():
+                encoding = 'utf-8'
+            return bytes(body).decode(encoding, errors='replace')
 
     def clean_text(self, html: str) -> str:
         soup = BeautifulSoup(html, 'html.parser')
@@ -39,6 +216,15 @@ class Scraper:
         
         return text
 
-    def chunk_text(self, text: str, chunk_size: int = 1000) -> list[str]:
-        # Simple chunking by characters for now
-        return [text[i:i+chunk_size] for i in range(0, len(text), chunk_size)]
+    def iter_chunks(self, text: str, max_tokens: int = None, overlap_tokens: int = None):
+        # Token-aware, sentence-boundary chunks sized to the embedding model window
+        if max_tokens is None and overlap_tokens is None:
+            if self._chunker is None:
+                self._chunker = TokenChunker()
+            chunker = self._chunker
+        else:
+            chunker = TokenChunker(max_tokens=max_tokens, overlap_tokens=overlap_tokens)
+        yield from chunker.iter_chunks(text)
+
+    def chunk_text(self, text: str, max_tokens: int = None, overlap_tokens: int = None) -> list[str]:
+        return list(self.iter_chunks(text, max_tokens, overlap_tokens))
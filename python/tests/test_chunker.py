@@ -0,0 +1,58 @@
+from chunker import TokenChunker
+
+
+class WhitespaceTokenizer:
+    """One token per whitespace-separated word, so limits can be checked exactly."""
+    is_fast = False
+
+    def encode(self, text, add_special_tokens=False):
+        return text.split()
+
+
+def tokens(text):
+    return len(text.split())
+
+
+def sentences(n):
+    return " ".join(f"Sentence {i} has some words." for i in range(n))
+
+
+def test_chunks_stay_inside_the_window():
+    chunker = TokenChunker(max_tokens=50, overlap_tokens=10, tokenizer=WhitespaceTokenizer())
+    chunks = list(chunker.iter_chunks(sentences(60)))
+
+    assert len(chunks) > 1
+    assert all(tokens(c) <= chunker.budget for c in chunks)
+    assert chunker.budget == 48  # [CLS] and [SEP] are reserved
+
+
+def test_overlap_is_bounded_and_repeats_the_tail():
+    chunker = TokenChunker(max_tokens=50, overlap_tokens=10, tokenizer=WhitespaceTokenizer())
+    chunks = list(chunker.iter_chunks(sentences(60)))
+
+    for previous, current in zip(chunks, chunks[1:]):
+        prev_lines, cur_lines = previous.split("\n"), current.split("\n")
+        shared = next(n for n in range(len(cur_lines), -1, -1) if prev_lines[len(prev_lines) - n:] == cur_lines[:n])
+        assert shared >= 1
+        assert sum(tokens(s) for s in cur_lines[:shared]) <= chunker.overlap_tokens
+
+
+def test_no_overlap_across_a_section_break():
+    chunker = TokenChunker(max_tokens=50, overlap_tokens=10, tokenizer=WhitespaceTokenizer())
+    text = sentences(6) + "\nData Retention\n" + sentences(3)
+    chunks = list(chunker.iter_chunks(text))
+
+    assert chunks[1].startswith("Data Retention")
+
+
+def test_oversized_sentence_is_hard_split():
+    chunker = TokenChunker(max_tokens=50, overlap_tokens=0, tokenizer=WhitespaceTokenizer())
+    chunks = list(chunker.iter_chunks(" ".join(f"w{i}" for i in range(200))))
+
+    assert all(tokens(c) <= chunker.budget for c in chunks)
+    assert " ".join(chunks).split() == [f"w{i}" for i in range(200)]
+
+
+def test_overlap_never_exceeds_half_the_window():
+    chunker = TokenChunker(max_tokens=50, overlap_tokens=500, tokenizer=WhitespaceTokenizer())
+    assert chunker.overlap_tokens == chunker.budget // 2
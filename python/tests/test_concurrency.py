@@ -0,0 +1,69 @@
+from concurrency import AIMDLimiter
+
+
+def limiter(**kwargs):
+    return AIMDLimiter("test", **{"initial": 2, "max_limit": 8, "cooldown": 60.0, **kwargs})
+
+
+def test_grows_by_one_after_a_saturated_window():
+    aimd = limiter()
+    aimd.acquire()
+    aimd.acquire()
+    aimd.release(0.1)
+    aimd.acquire()  # keep the limit in use
+    aimd.release(0.1)
+
+    assert aimd.limit == 3
+
+
+def test_does_not_grow_when_limit_is_unused():
+    aimd = limiter(initial=4)
+    for _ in range(8):
+        aimd.acquire()
+        aimd.release(0.1)
+
+    assert aimd.limit == 4
+
+
+def test_overload_halves_once_per_cooldown():
+    aimd = limiter(initial=8)
+    for _ in range(3):
+        aimd.acquire()
+        aimd.release(0.1, overloaded=True)
+
+    assert aimd.limit == 4
+
+
+def test_high_error_rate_cuts_and_min_limit_holds():
+    aimd = limiter(initial=2, min_limit=1, cooldown=0.0)
+    for _ in range(6):
+        aimd.acquire()
+        aimd.release(0.1, failed=True)
+
+    assert aimd.limit == 1
+
+
+def test_slot_counts_exceptions_as_failures():
+    aimd = limiter(initial=2, cooldown=0.0)
+    for _ in range(2):
+        try:
+            with aimd.slot():
+                raise RuntimeError("boom")
+        except RuntimeError:
+            pass
+
+    assert aimd.in_flight == 0
+    assert aimd.limit == 1
+
+
+def test_latency_baseline_follows_recent_windows():
+    aimd = limiter(initial=1, max_limit=1, latency_tolerance=2.0, baseline_weight=0.5)
+    aimd.acquire()
+    aimd.release(0.01)  # one very fast request
+    for _ in range(10):
+        aimd.acquire()
+        aimd.release(1.0)
+
+    assert aimd.baseline_latency > 0.9
+    assert aimd.avg_latency <= aimd.baseline_latency * aimd.latency_tolerance
+
@@ -0,0 +1,49 @@
+from dedup import PolicyDocumentIndex, content_hash, normalize_url
+
+
+def test_normalize_url_canonicalises_equivalent_urls():
+    variants = [
+        "https://www.Example.com/privacy/",
+        "http://example.com/privacy",
+        "example.com/privacy#section-2",
+        "https://example.com/privacy?utm_source=footer",
+    ]
+    assert {normalize_url(u) for u in variants} == {"https://example.com/privacy"}
+
+
+def test_normalize_url_keeps_meaningful_query_in_stable_order():
+    assert normalize_url("https://example.com/legal?b=2&a=1") == normalize_url("https://example.com/legal?a=1&b=2")
+    assert normalize_url("https://example.com/legal?doc=privacy") != normalize_url("https://example.com/legal?doc=terms")
+
+
+def test_content_hash_ignores_whitespace_only():
+    assert content_hash("We collect  data.\n\nWe share it.") == content_hash("We collect data. We share it.")
+    assert content_hash("We collect data.") != content_hash("We sell data.")
+
+
+def test_same_content_under_another_url_is_not_new():
+    index = PolicyDocumentIndex()
+    first = index.add_document("https://a.com/privacy", "Shared policy text.", lambda t: [t])
+    second = index.add_document("https://b.com/privacy", "Shared policy text.", lambda t: [t])
+
+    assert first[2] is True and second[2] is False
+    assert first[0] == second[0]
+
+
+
+def test_evicted_documents_are_treated_as_unseen():
+    index = PolicyDocumentIndex(max_documents=2)
+    for name in "abc":
+        index.add_document(f"https://{name}.com/privacy", f"Policy {name}.", lambda t: [t])
+
+    assert index.lookup_url("https://a.com/privacy") is None
+    assert index.lookup_url("https://c.com/privacy")[1] == ["Policy c."]
+
+
+def test_baseline_is_the_static_text_for_rendered_pages():
+    index = PolicyDocumentIndex()
+    index.add_document("https://spa.com/privacy", "Rendered policy.", lambda t: [t], static_text="")
+    index.add_document("https://static.com/privacy", "Static policy.", lambda t: [t])
+
+    assert index.baseline_hash("https://spa.com/privacy") is None
+    assert index.baseline_hash("https://static.com/privacy") == content_hash("Static policy.")
@@ -0,0 +1,186 @@
+import pytest
+
+np = pytest.importorskip("numpy")
+import local_index
+from local_index import LocalVectorIndex
+
+DIM = 16
+
+
+def make_points(n, seed=0):
+    rng = np.random.default_rng(seed)
+    vectors = rng.normal(size=(n, DIM)).astype(np.float32)
+    payloads = [{"domain": f"d{i % 7}", "type": "privacy" if i % 2 else "terms", "flag": bool(i % 3)}
+                for i in range(n)]
+    return vectors, payloads
+
+
+def brute_force(vectors, query, limit, rows=None):
+    normed = vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+    scores = normed @ (query / np.linalg.norm(query))
+    rows = list(range(len(vectors))) if rows is None else rows
+    return [f"p{i}" for i in sorted(rows, key=lambda i: -scores[i])[:limit]]
+
+
+def build(vectors, payloads, path=None, **kwargs):
+    index = LocalVectorIndex(path, **kwargs)
+    for start in range(0, len(vectors), 250):
+        end = start + 250
+        index.add([f"p{i}" for i in range(start, min(end, len(vectors)))], vectors[start:end], payloads[start:end])
+    return index
+
+
+def test_exact_search_matches_brute_force():
+    vectors, payloads = make_points(1000)
+    index = build(vectors, payloads)
+    query = np.random.default_rng(1).normal(size=DIM)
+
+    hits = index.search(query, limit=5)
+
+    assert [h[0] for h in hits] == brute_force(vectors, query, 5)
+    scores = [h[1] for h in hits]
+    assert scores == sorted(scores, reverse=True)
+    assert hits[0][2] == payloads[int(hits[0][0][1:])]
+
+
+def test_filter_is_equality_on_every_key():
+    # Same semantics as Qdrant Filter(must=[FieldCondition(key, MatchValue(value)), ...])
+    vectors, payloads = make_points(1000)
+    index = build(vectors, payloads)
+    query = np.random.default_rng(2).normal(size=DIM)
+    wanted = {"domain": "d3", "type": "privacy", "flag": True}
+    matching = [i for i, p in enumerate(payloads) if all(p[k] == v for k, v in wanted.items())]
+
+    hits = index.search(query, limit=3, filter_dict=wanted)
+
+    assert [h[0] for h in hits] == brute_force(vectors, query, 3, matching)
+    assert all(all(h[2][k] == v for k, v in wanted.items()) for h in hits)
+    assert index.search(query, limit=3, filter_dict={"domain": "missing"}) == []
+    # No type coercion: 1 and "1" are different values
+    assert index.search(query, limit=3, filter_dict={"flag": "true"}) == []
+
+
+def test_large_index_without_ann_library_stays_exact(monkeypatch):
+    monkeypatch.setattr(local_index, "hnswlib", None)
+    vectors, payloads = make_points(600)
+    index = build(vectors, payloads, exact_threshold=50)
+    query = np.random.default_rng(3).normal(size=DIM)
+
+    assert [h[0] for h in index.search(query, limit=5)] == brute_force(vectors, query, 5)
+
+
+def test_selective_filter_falls_back_to_exact_above_threshold():
+    pytest.importorskip("hnswlib")
+    vectors, payloads = make_points(3000)
+    payloads[1234]["domain"] = "rare"
+    index = build(vectors, payloads, exact_threshold=100)
+    query = np.random.default_rng(4).normal(size=DIM)
+
+    hits = index.search(query, limit=3, filter_dict={"domain": "rare"})
+
+    assert [h[0] for h in hits] == ["p1234"]
+
+
+def test_reopen_from_path(tmp_path):
+    vectors, payloads = make_points(500)
+    path = str(tmp_path / "policy_chunks")
+    query = np.random.default_rng(5).normal(size=DIM)
+    index = build(vectors, payloads, path)
+    before = index.search(query, limit=5, filter_dict={"type": "terms"})
+    index.close()
+
+    reopened = LocalVectorIndex(path)
+
+    assert reopened.count == 500 and reopened.dim == DIM
+    assert reopened.search(query, limit=5, filter_dict={"type": "terms"}) == before
+
+
+def test_reopen_ignores_vectors_from_an_interrupted_write(tmp_path):
+    vectors, payloads = make_points(300)
+    path = str(tmp_path / "policy_chunks")
+    build(vectors[:200], payloads[:200], path).close()
+    # Simulate a crash after the vector bytes were written but before the payloads were committed
+    with open(tmp_path / "policy_chunks" / "vectors.f32", "ab") as f:
+        f.write(np.ones((5, DIM), dtype=np.float32).tobytes())
+
+    index = LocalVectorIndex(path)
+    index.add([f"p{i}" for i in range(200, 300)], vectors[200:], payloads[200:])
+    query = np.random.default_rng(6).normal(size=DIM)
+
+    assert index.count == 300
+    assert [h[0] for h in index.search(query, limit=5)] == brute_force(vectors, query, 5)
+
+
+def test_dimension_mismatch_is_rejected():
+    index = LocalVectorIndex()
+    index.add(["a"], [[1.0, 0.0]], [{}])
+    with pytest.raises(ValueError):
+        index.add(["b"], [[1.0, 0.0, 0.0]], [{}])
+
+
+def test_instances_on_one_path_share_rows(tmp_path):
+    # Two handles on one directory, as two worker processes would have
+    vectors, payloads = make_points(400)
+    path = str(tmp_path / "policy_chunks")
+    first, second = LocalVectorIndex(path), LocalVectorIndex(path)
+    for start in range(0, 400, 100):
+        writer = first if start % 200 else second
+        writer.add([f"p{i}" for i in range(start, start + 100)], vectors[start:start + 100], payloads[start:start + 100])
+    query = np.random.default_rng(7).normal(size=DIM)
+
+    assert [h[0] for h in first.search(query, limit=5)] == brute_force(vectors, query, 5)
+    assert second.search(query, limit=5) == first.search(query, limit=5)
+    assert first.count == second.count == 400
+
+
+def test_get_local_index_shares_one_instance_per_path(tmp_path):
+    path = str(tmp_path / "policy_chunks")
+
+    assert local_index.get_local_index(path) is local_index.get_local_index(path + "/")
+    assert local_index.get_local_index(path) is not local_index.get_local_index(str(tmp_path / "other"))
+
+
+@pytest.mark.parametrize("exact_threshold", [None, 50])
+def test_deleted_points_are_not_returned(tmp_path, exact_threshold):
+    if exact_threshold is not None:
+        pytest.importorskip("hnswlib")
+    vectors, payloads = make_points(600)
+    for i, payload in enumerate(payloads):
+        payload["url"] = f"https://d{i % 7}.com/{payload['type']}"
+    path = str(tmp_path / "policy_chunks")
+    index = build(vectors, payloads, path, exact_threshold=exact_threshold)
+    other = LocalVectorIndex(path, exact_threshold=exact_threshold)
+    query = np.random.default_rng(8).normal(size=DIM)
+    index.search(query, limit=5)  # builds the ANN index before the delete
+    other.search(query, limit=5)
+
+    assert index.delete({"url": "https://d3.com/privacy"}) == sum(p["url"] == "https://d3.com/privacy" for p in payloads)
+
+    alive = [i for i, p in enumerate(payloads) if p["url"] != "https://d3.com/privacy"]
+    for handle in (index, other):
+        assert [h[0] for h in handle.search(query, limit=5)] == brute_force(vectors, query, 5, alive)
+        assert handle.search(query, limit=5, filter_dict={"url": "https://d3.com/privacy"}) == []
+
+
+def test_opening_an_index_from_before_filter_columns(tmp_path):
+    import json, sqlite3
+    path = tmp_path / "policy_chunks"
+    path.mkdir()
+    vectors, payloads = make_points(50)
+    (path / "vectors.f32").write_bytes((vectors / np.linalg.norm(vectors, axis=1, keepdims=True)).tobytes())
+    db = sqlite3.connect(path / "payloads.db")
+    db.execute("CREATE TABLE points (row INTEGER PRIMARY KEY, id TEXT NOT NULL, payload TEXT)")
+    db.execute("CREATE TABLE meta (key TEXT PRIMARY KEY, value TEXT)")
+    db.execute("INSERT INTO meta VALUES ('dim', ?)", (str(DIM),))
+    db.executemany("INSERT INTO points VALUES (?, ?, ?)", [(i, f"p{i}", json.dumps(p)) for i, p in enumerate(payloads)])
+    db.commit()
+    db.close()
+
+    index = LocalVectorIndex(str(path))
+    query = np.random.default_rng(9).normal(size=DIM)
+    matching = [i for i, p in enumerate(payloads) if p["domain"] == "d2"]
+    hits = index.search(query, limit=3, filter_dict={"domain": "d2"})
+
+    assert index.count == 50
+    assert [h[0] for h in hits] == brute_force(vectors, query, 3, matching)
+    assert hits[0][2] == payloads[int(hits[0][0][1:])]
@@ -0,0 +1,59 @@
+import pytest
+
+pytest.importorskip("psycopg2")
+import processing_log
+
+
+class FakeCursor:
+    def __init__(self, conn):
+        self.conn = conn
+
+    def execute(self, sql, params=None):
+        self.conn.calls += 1
+        if self.conn.fail:
+            raise RuntimeError("function ensure_processing_log_partitions does not exist")
+
+    def fetchone(self):
+        return (0,)
+
+    def close(self):
+        pass
+
+
+class FakeConn:
+    def __init__(self, fail=False):
+        self.fail = fail
+        self.calls = 0
+
+    def cursor(self):
+        return FakeCursor(self)
+
+    def commit(self):
+        pass
+
+    def rollback(self):
+        pass
+
+
+@pytest.fixture(autouse=True)
+def reset_schedule(monkeypatch):
+    monkeypatch.setattr(processing_log, "_next_maintenance", 0.0)
+
+
+def test_maintenance_runs_once_per_interval():
+    conn = FakeConn()
+    processing_log.maintain_partitions(conn)
+    processing_log.maintain_partitions(conn)
+
+    assert conn.calls == 2  # ensure + drop, once
+
+
+def test_failed_maintenance_is_retried_sooner(monkeypatch):
+    monkeypatch.setattr(processing_log, "MAINTENANCE_RETRY", 0.0)
+    failing = FakeConn(fail=True)
+    processing_log.maintain_partitions(failing)
+
+    conn = FakeConn()
+    processing_log.maintain_partitions(conn)
+
+    assert conn.calls == 2
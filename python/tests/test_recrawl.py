@@ -0,0 +1,68 @@
+import pytest
+
+recrawl = pytest.importorskip("recrawl")
+from recrawl import DEFAULT_INTERVAL, MAX_INTERVAL, MIN_INTERVAL, estimate_interval
+
+DAY = 24 * 3600
+
+
+def test_no_history_uses_default():
+    assert estimate_interval(0, 0, 0) == DEFAULT_INTERVAL
+
+
+def test_never_changed_backs_off():
+    assert estimate_interval(10, 0, 7 * DAY) > 7 * DAY
+
+
+def test_always_changed_is_checked_more_often_but_not_below_minimum():
+    interval = estimate_interval(10, 10, 7 * DAY)
+    assert MIN_INTERVAL <= interval < 7 * DAY
+
+
+def test_more_changes_means_shorter_interval():
+    intervals = [estimate_interval(20, x, 7 * DAY) for x in (1, 5, 10, 15)]
+    assert intervals == sorted(intervals, reverse=True)
+    assert all(MIN_INTERVAL <= i <= MAX_INTERVAL for i in intervals)
+
+
+class FakeScraper:
+    def __init__(self, result):
+        self.result = result
+
+    def fetch_conditional(self, url, etag=None, last_modified=None):
+        return {"etag": None, "last_modified": None, **self.result}
+
+    def clean_text(self, html):
+        return html
+
+
+class FakeCursor:
+    def __init__(self):
+        self.statements = []
+
+    def execute(self, sql, params=None):
+        self.statements.append((" ".join(sql.split()), params))
+
+
+PAGE = {"id": 1, "company_id": "c1", "url": "https://example.com/privacy", "content_hash": "abc",
+        "check_count": 4, "change_count": 1, "age_seconds": 40 * DAY}
+
+
+def test_failed_fetch_leaves_the_estimate_alone():
+    cursor = FakeCursor()
+    scheduler = recrawl.RecrawlScheduler(scraper=FakeScraper({"status": None, "text": ""}))
+
+    assert scheduler.check_page(cursor, dict(PAGE)) is False
+    updates = [sql for sql, _ in cursor.statements if sql.startswith("UPDATE policy_pages")]
+    assert updates and all("check_count" not in sql and "content_hash" not in sql for sql in updates)
+    assert not any(sql.startswith("UPDATE companies") for sql, _ in cursor.statements)
+
+
+def test_changed_page_updates_history_and_requeues():
+    cursor = FakeCursor()
+    scheduler = recrawl.RecrawlScheduler(scraper=FakeScraper({"status": 200, "text": "New policy."}))
+
+    assert scheduler.check_page(cursor, dict(PAGE)) is True
+    update = next(params for sql, params in cursor.statements if sql.startswith("UPDATE policy_pages"))
+    assert update[4:6] == (5, 2)  # check_count, change_count
+    assert any(sql.startswith("UPDATE companies") for sql, _ in cursor.statements)
@@ -0,0 +1,112 @@
+import asyncio
+import sys
+import types
+
+from renderer import BrowserPool
+
+
+class FakeContext:
+    def __init__(self, browser, broken=False):
+        self.browser = browser
+        self.broken = broken
+        self.closed = False
+
+    async def new_page(self):
+        if self.broken or not self.browser.connected:
+            raise RuntimeError("Target closed")
+        return FakePage()
+
+    async def clear_cookies(self):
+        if self.broken:
+            raise RuntimeError("Target closed")
+
+    async def close(self):
+        self.closed = True
+
+    async def route(self, pattern, handler):
+        pass
+
+
+class FakePage:
+    async def close(self):
+        pass
+
+
+class FakeBrowser:
+    def __init__(self):
+        self.connected = True
+
+    def is_connected(self):
+        return self.connected
+
+    async def new_context(self, **kwargs):
+        return FakeContext(self)
+
+    async def close(self):
+        self.connected = False
+
+
+class FakeChromium:
+    def __init__(self):
+        self.launches = 0
+
+    async def launch(self, headless=True):
+        self.launches += 1
+        return FakeBrowser()
+
+
+class FakePlaywright:
+    def __init__(self):
+        self.chromium = FakeChromium()
+
+
+class FakeAsyncPlaywright:
+    async def start(self):
+        return FakePlaywright()
+
+
+def make_pool(monkeypatch, pool_size=1):
+    monkeypatch.setitem(sys.modules, "playwright", types.ModuleType("playwright"))
+    monkeypatch.setitem(sys.modules, "playwright.async_api",
+                        types.SimpleNamespace(async_playwright=FakeAsyncPlaywright))
+    pool = BrowserPool(pool_size=pool_size, page_timeout=1)
+
+    async def load(page, url):
+        return f"<html>{url}</html>"
+
+    pool._load = load
+    return pool
+
+
+def test_broken_context_is_replaced_and_requeued(monkeypatch):
+    pool = make_pool(monkeypatch)
+
+    async def scenario():
+        await pool._start()
+        context, _, _ = pool._contexts.get_nowait()
+        context.broken = True
+        pool._contexts.put_nowait((context, 0, pool._generation))
+        try:
+            await pool._render("https://a.com")
+        except RuntimeError:
+            pass
+        assert pool._contexts.qsize() == 1
+        return await pool._render("https://b.com")
+
+    assert asyncio.run(scenario()) == "<html>https://b.com</html>"
+    assert not pool.disabled
+
+
+def test_browser_is_relaunched_after_disconnect(monkeypatch):
+    pool = make_pool(monkeypatch, pool_size=2)
+
+    async def scenario():
+        await pool._start()
+        pool._browser.connected = False
+        first = await pool._render("https://a.com")
+        second = await pool._render("https://b.com")
+        return first, second
+
+    assert asyncio.run(scenario()) == ("<html>https://a.com</html>", "<html>https://b.com</html>")
+    assert pool._playwright.chromium.launches == 2
+    assert pool._generation == 1
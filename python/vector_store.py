@@ -1,18 +1,65 @@
 import requests
 import os
+import uuid
+from requests.adapters import HTTPAdapter
 from qdrant_client import QdrantClient
 from qdrant_client.http import models as rest
 try:
     from langchain_huggingface import HuggingFaceEmbeddings
 except ImportError:
     from langchain_community.embeddings import HuggingFaceEmbeddings
+try:
+    from .chunker import EMBEDDING_MODEL_NAME
+    from .metrics import timed
+    from .local_index import get_local_index
+except ImportError:
+    from chunker import EMBEDDING_MODEL_NAME
+    from metrics import timed
+    from local_index import get_local_index
+
+
+class Hit:
+    """Search result with the same attributes as a qdrant ScoredPoint (h.payload['...'] in main.py)."""
+
+    def __init__(self, data):
+        self.payload = data.get('payload', {})
+        self.score = data.get('score')
+        self.id = data.get('id')
+
+
+# Chunks embedded per call when streaming a document through add_chunks
+EMBED_BATCH_SIZE = int(os.getenv("EMBED_BATCH_SIZE", 32))
+
 
 class VectorStore:
-    def __init__(self):
-        self.qdrant_url = os.getenv("QDRANT_URL", "http://localhost:6333")
-        self.client = QdrantClient(url=self.qdrant_url)
+    def __init__(self, embeddings=None):
         self.collection_name = "policy_chunks"
-        self.embeddings = HuggingFaceEmbeddings(model_name="all-MiniLM-L6-v2")
+        self.embeddings = embeddings or HuggingFaceEmbeddings(model_name=EMBEDDING_MODEL_NAME)
+        # VECTOR_BACKEND=local keeps the collection in-process (see local_index.py), no Qdrant needed
+        self.backend = os.getenv("VECTOR_BACKEND", "qdrant").lower()
+        if self.backend == "local":
+            store_path = os.getenv("VECTOR_STORE_PATH")
+            self.local = True
+            # Shared per path: every VectorStore in the process appends to the same index
+            self.index = get_local_index(os.path.join(store_path, self.collection_name) if store_path else None)
+            return
+
+        self.qdrant_url = os.getenv("QDRANT_URL", "http://localhost:6333")
+        qdrant_path = os.getenv("QDRANT_PATH")
+        # Local modes (no server): QDRANT_URL=":memory:" or QDRANT_PATH=/some/dir
+        self.local = self.qdrant_url == ":memory:" or bool(qdrant_path)
+        if qdrant_path:
+            self.client = QdrantClient(path=qdrant_path)
+        elif self.qdrant_url == ":memory:":
+            self.client = QdrantClient(location=":memory:")
+        else:
+            self.client = QdrantClient(url=self.qdrant_url)
+        self.index = None
+        # Pooled keep-alive connections for the raw HTTP search path
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=int(os.getenv("QDRANT_HTTP_POOL_SIZE", 16)))
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
         self._ensure_collection()
 
     def _ensure_collection(self):
@@ -26,9 +73,30 @@ class VectorStore:
                     distance=rest.Distance.COSINE,
                 ),
             )
+        # Keyword indexes for the payload fields searches filter on and re-embedding deletes by
+        for field in ("url", "domain"):
+            try:
+                self.client.create_payload_index(self.collection_name, field_name=field,
+                                                 field_schema=rest.PayloadSchemaType.KEYWORD)
+            except Exception as e:
+                print(f"Warning: could not create payload index on {field}: {e}")
+
+    @staticmethod
+    def _qdrant_filter(filter_dict: dict):
+        return rest.Filter(must=[
+            rest.FieldCondition(key=k, match=rest.MatchValue(value=v))
+            for k, v in filter_dict.items()
+        ])
 
     def add_texts(self, texts: list[str], metadatas: list[dict]):
-        embeddings = self.embeddings.embed_documents(texts)
+        with timed("embed"):
+            embeddings = self.embeddings.embed_documents(texts)
+
+        if self.index is not None:
+            with timed("upsert"):
+                self.index.add([str(uuid.uuid4()) for _ in embeddings], embeddings, metadatas)
+            return
+
         points = [
             rest.PointStruct(
                 id=i,  # Ideally generate UUIDs
@@ -38,18 +106,71 @@ class VectorStore:
             for i, (embedding, metadata) in enumerate(zip(embeddings, metadatas))
         ]
         # In a real app, use UUIDs for IDs to avoid collisions on subsequent runs
-        import uuid
         for p in points:
             p.id = str(uuid.uuid4())
             
-        self.client.upsert(
-            collection_name=self.collection_name,
-            points=points
-        )
+        with timed("upsert"):
+            self.client.upsert(
+                collection_name=self.collection_name,
+                points=points
+            )
+
 
+    def add_chunks(self, chunks, metadata: dict, batch_size: int = None) -> list[str]:
+        """
+        Embed and store chunks as they are produced (e.g. from Scraper.iter_chunks),
+        `batch_size` at a time, so a large document is never embedded in one call.
+        Each point's payload is `metadata` plus its "text". Returns the chunks stored.
+        """
+        batch_size = batch_size or EMBED_BATCH_SIZE
+        stored, batch = [], []
+        for chunk in chunks:
+            batch.append(chunk)
+            if len(batch) >= batch_size:
+                self.add_texts(batch, [{**metadata, "text": c} for c in batch])
+                stored.extend(batch)
+                batch = []
+        if batch:
+            self.add_texts(batch, [{**metadata, "text": c} for c in batch])
+            stored.extend(batch)
+        return stored
+
+    def delete(self, filter_dict: dict):
+        """Delete every point whose payload matches filter_dict, e.g. {"url": url} before re-embedding a page."""
+        if not filter_dict:
+            raise ValueError("delete() needs a filter")
+        with timed("upsert"):
+            if self.index is not None:
+                self.index.delete(filter_dict)
+            else:
+                self.client.delete(collection_name=self.collection_name,
+                                   points_selector=rest.FilterSelector(filter=self._qdrant_filter(filter_dict)))
 
     def search(self, query: str, limit: int = 5, filter_dict: dict = None):
         query_vector = self.embeddings.embed_query(query)
+
+        if self.index is not None:
+            try:
+                return [Hit({"id": i, "score": score, "payload": payload})
+                        for i, score, payload in self.index.search(query_vector, limit, filter_dict)]
+            except Exception as e:
+                print(f"Error searching local vector index: {e}")
+                return []
+
+        if self.local:
+            # No HTTP endpoint in local mode, go through the client
+            query_filter = self._qdrant_filter(filter_dict) if filter_dict else None
+            try:
+                return self.client.search(
+                    collection_name=self.collection_name,
+                    query_vector=query_vector,
+                    query_filter=query_filter,
+                    limit=limit,
+                    with_payload=True,
+                )
+            except Exception as e:
+                print(f"Error searching Qdrant: {e}")
+                return []
         
         # Raw HTTP search to avoid client version issues
         url = f"{self.qdrant_url}/collections/{self.collection_name}/points/search"
@@ -68,17 +189,9 @@ class VectorStore:
              payload["filter"] = {"must": conditions}
 
         try:
-            resp = requests.post(url, json=payload)
+            resp = self.session.post(url, json=payload)
             resp.raise_for_status()
             result = resp.json().get('result', [])
-            
-            # Wrap in object to match main.py expectation (h.payload['...'])
-            class Hit:
-                def __init__(self, data):
-                    self.payload = data.get('payload', {})
-                    self.score = data.get('score')
-                    self.id = data.get('id')
-            
             return [Hit(r) for r in result]
             
         except Exception as e:
@@ -11,21 +11,62 @@ CREATE TABLE IF NOT EXISTS companies (
     privacy_email VARCHAR(255),
     delete_link TEXT,
     country VARCHAR(100),
-    status VARCHAR(50) DEFAULT 'pending',
+    status VARCHAR(50) DEFAULT 'pending', -- 'pending', 'processing', 'completed', 'failed'
     processed_at TIMESTAMP,
     error_message TEXT,
+    -- Set when a worker claims the row (status 'processing'); see python/batch_processor.py
+    claimed_by VARCHAR(128),
+    claimed_at TIMESTAMP,
     created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
 );
 
+ALTER TABLE companies
+    ADD COLUMN IF NOT EXISTS claimed_by VARCHAR(128),
+    ADD COLUMN IF NOT EXISTS claimed_at TIMESTAMP;
+
 CREATE TABLE IF NOT EXISTS policy_pages (
     id SERIAL PRIMARY KEY,
     company_id VARCHAR(255) REFERENCES companies(id),
     url TEXT NOT NULL,
     page_type VARCHAR(50), -- 'privacy', 'terms', 'other'
     discovered_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    -- Change tracking for incremental recrawls (see python/recrawl.py)
+    content_hash VARCHAR(64),
+    etag TEXT,
+    last_modified TEXT,
+    last_checked_at TIMESTAMP,
+    last_changed_at TIMESTAMP,
+    check_count INTEGER DEFAULT 0,
+    change_count INTEGER DEFAULT 0,
+    check_interval_seconds INTEGER,
+    next_check_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP, -- new pages are due immediately
     UNIQUE(company_id, page_type)
 );
 
+-- Existing databases: CREATE TABLE IF NOT EXISTS above leaves an older policy_pages untouched
+ALTER TABLE policy_pages
+    ADD COLUMN IF NOT EXISTS content_hash VARCHAR(64),
+    ADD COLUMN IF NOT EXISTS etag TEXT,
+    ADD COLUMN IF NOT EXISTS last_modified TEXT,
+    ADD COLUMN IF NOT EXISTS last_checked_at TIMESTAMP,
+    ADD COLUMN IF NOT EXISTS last_changed_at TIMESTAMP,
+    ADD COLUMN IF NOT EXISTS check_count INTEGER DEFAULT 0,
+    ADD COLUMN IF NOT EXISTS change_count INTEGER DEFAULT 0,
+    ADD COLUMN IF NOT EXISTS check_interval_seconds INTEGER,
+    ADD COLUMN IF NOT EXISTS next_check_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP;
+
+CREATE INDEX IF NOT EXISTS idx_policy_pages_next_check ON policy_pages (next_check_at);
+
+-- One row per recrawl check; the change history behind each page's check interval
+CREATE TABLE IF NOT EXISTS policy_page_checks (
+    id SERIAL PRIMARY KEY,
+    page_id INTEGER REFERENCES policy_pages(id) ON DELETE CASCADE,
+    checked_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    http_status INTEGER,
+    content_hash VARCHAR(64),
+    changed BOOLEAN
+);
+
 CREATE TABLE IF NOT EXISTS policy_scopes (
     company_id VARCHAR(255) REFERENCES companies(id) PRIMARY KEY,
     scope_registration BOOLEAN DEFAULT FALSE,
@@ -36,12 +77,150 @@ CREATE TABLE IF NOT EXISTS policy_scopes (
     last_updated TIMESTAMP DEFAULT CURRENT_TIMESTAMP
 );
 
+-- Append-only and written several times per company, so it is partitioned by month:
+-- old months are removed with a cheap DROP TABLE instead of a DELETE + vacuum.
+
+-- Creates monthly partitions processing_log_YYYYMM from `from_month` through `months_ahead` months later
+DROP FUNCTION IF EXISTS ensure_processing_log_partitions(INTEGER);
+CREATE OR REPLACE FUNCTION ensure_processing_log_partitions(months_ahead INTEGER DEFAULT 2, from_month DATE DEFAULT CURRENT_DATE) RETURNS void AS $$
+DECLARE
+    month_start DATE;
+    partition_name TEXT;
+BEGIN
+    FOR i IN 0..months_ahead LOOP
+        month_start := (date_trunc('month', from_month) + make_interval(months => i))::date;
+        partition_name := 'processing_log_' || to_char(month_start, 'YYYYMM');
+        IF to_regclass(partition_name) IS NULL THEN
+            BEGIN
+                EXECUTE format('CREATE TABLE %I PARTITION OF processing_log FOR VALUES FROM (%L) TO (%L)',
+                               partition_name, month_start, (month_start + interval '1 month')::date);
+            EXCEPTION WHEN others THEN
+                -- e.g. rows for that month already sit in the default partition
+                RAISE NOTICE 'Could not create %: %', partition_name, SQLERRM;
+            END;
+        END IF;
+    END LOOP;
+END;
+$$ LANGUAGE plpgsql;
+
+-- Drops monthly partitions older than `retain_months`; returns how many were dropped
+CREATE OR REPLACE FUNCTION drop_old_processing_log_partitions(retain_months INTEGER DEFAULT 6) RETURNS INTEGER AS $$
+DECLARE
+    cutoff TEXT := to_char(date_trunc('month', CURRENT_DATE) - make_interval(months => retain_months), 'YYYYMM');
+    part RECORD;
+    dropped INTEGER := 0;
+BEGIN
+    FOR part IN
+        SELECT c.relname
+        FROM pg_inherits i
+        JOIN pg_class c ON c.oid = i.inhrelid
+        JOIN pg_class p ON p.oid = i.inhparent
+        WHERE p.relname = 'processing_log' AND c.relname ~ '^processing_log_[0-9]{6}$'
+    LOOP
+        IF substring(part.relname FROM 16) < cutoff THEN
+            EXECUTE format('DROP TABLE %I', part.relname);
+            dropped := dropped + 1;
+        END IF;
+    END LOOP;
+    RETURN dropped;
+END;
+$$ LANGUAGE plpgsql;
+
+-- Existing databases: set an older, unpartitioned processing_log aside; its rows are copied below
+DO $$
+BEGIN
+    IF EXISTS (SELECT 1 FROM pg_class WHERE oid = to_regclass('processing_log') AND relkind = 'r') THEN
+        ALTER TABLE processing_log RENAME TO processing_log_unpartitioned;
+    END IF;
+END;
+$$;
+
 CREATE TABLE IF NOT EXISTS processing_log (
-    id SERIAL PRIMARY KEY,
+    id BIGSERIAL,
     company_id VARCHAR(255) REFERENCES companies(id),
     step VARCHAR(50),
     status VARCHAR(50),
     message TEXT,
     duration_seconds FLOAT,
+    created_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    PRIMARY KEY (id, created_at)
+) PARTITION BY RANGE (created_at);
+
+-- Catches rows if partition maintenance ever falls behind
+CREATE TABLE IF NOT EXISTS processing_log_default PARTITION OF processing_log DEFAULT;
+
+CREATE INDEX IF NOT EXISTS idx_processing_log_company ON processing_log (company_id, created_at);
+
+SELECT ensure_processing_log_partitions(2);
+
+-- Move rows from the old table into monthly partitions so retention applies to them too
+DO $$
+DECLARE
+    first_month DATE;
+BEGIN
+    IF to_regclass('processing_log_unpartitioned') IS NOT NULL THEN
+        SELECT date_trunc('month', MIN(created_at))::date INTO first_month FROM processing_log_unpartitioned;
+        IF first_month IS NOT NULL THEN
+            PERFORM ensure_processing_log_partitions(
+                ((EXTRACT(YEAR FROM CURRENT_DATE) - EXTRACT(YEAR FROM first_month)) * 12
+                 + EXTRACT(MONTH FROM CURRENT_DATE) - EXTRACT(MONTH FROM first_month))::int,
+                first_month);
+        END IF;
+        INSERT INTO processing_log (id, company_id, step, status, message, duration_seconds, created_at)
+        SELECT id, company_id, step, status, message, duration_seconds, COALESCE(created_at, CURRENT_TIMESTAMP)
+        FROM processing_log_unpartitioned;
+        PERFORM setval(pg_get_serial_sequence('processing_log', 'id'), COALESCE((SELECT MAX(id) FROM processing_log), 0) + 1, false);
+        DROP TABLE processing_log_unpartitioned;
+    END IF;
+END;
+$$;
+
+-- Hot-path indexes
+-- Claiming work: process_pending_companies polls status = 'pending' on every call
+CREATE INDEX IF NOT EXISTS idx_companies_pending ON companies (created_at) WHERE status = 'pending';
+-- Releasing claims left behind by workers that died mid-batch
+CREATE INDEX IF NOT EXISTS idx_companies_processing ON companies (claimed_at) WHERE status = 'processing';
+-- Incremental ("changed since") exports filter on processed_at (see python/export.py)
+CREATE INDEX IF NOT EXISTS idx_companies_processed_at ON companies (processed_at);
+-- Per-company page lookups are served by UNIQUE(company_id, page_type); recrawl history by page
+CREATE INDEX IF NOT EXISTS idx_policy_page_checks_page ON policy_page_checks (page_id, checked_at);
+
+-- Background batch jobs (see python/jobs.py). Per-company results live in
+-- batch_job_results rather than in one growing HTTP response.
+CREATE TABLE IF NOT EXISTS batch_jobs (
+    id VARCHAR(64) PRIMARY KEY,
+    status VARCHAR(50) DEFAULT 'queued', -- 'queued', 'running', 'completed', 'failed'
+    requested_limit INTEGER NOT NULL,
+    csv_path TEXT,
+    processed INTEGER DEFAULT 0,
+    successful INTEGER DEFAULT 0,
+    failed INTEGER DEFAULT 0,
+    error_message TEXT,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    started_at TIMESTAMP,
+    finished_at TIMESTAMP,
+    -- Server process running the job, and its last sign of life
+    owner VARCHAR(128),
+    heartbeat_at TIMESTAMP
+);
+
+ALTER TABLE batch_jobs
+    ADD COLUMN IF NOT EXISTS owner VARCHAR(128),
+    ADD COLUMN IF NOT EXISTS heartbeat_at TIMESTAMP;
+
+CREATE TABLE IF NOT EXISTS batch_job_results (
+    id SERIAL PRIMARY KEY,
+    job_id VARCHAR(64) REFERENCES batch_jobs(id) ON DELETE CASCADE,
+    company_id VARCHAR(255) REFERENCES companies(id),
+    domain VARCHAR(255),
+    status VARCHAR(50),
+    error TEXT,
+    privacy_url TEXT,
+    terms_url TEXT,
+    scopes_found INTEGER,
+    emails_found INTEGER,
+    duration_seconds FLOAT,
     created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
 );
+
+CREATE INDEX IF NOT EXISTS idx_batch_job_results_job ON batch_job_results (job_id, id);